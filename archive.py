@@ -0,0 +1,258 @@
+"""Archival of finished and abandoned games.
+
+Without it every game ever played stays in the lobby, player, board and
+suggestion tables. GameArchiver runs in the background every
+ARCHIVE_INTERVAL seconds. It copies the games that are over into
+compressed archive files and deletes their rows, so the tables only hold
+the games being set up or played:
+
+- finished games (status finished or abandoned), once
+  they have been over for ARCHIVE_FINISHED_TTL seconds;
+- lobbies and games nobody has touched for ARCHIVE_IDLE_TTL seconds, as
+  "abandoned".
+
+Archives are appended to ARCHIVE_DIR/games-YYYY-MM.jsonl.gz, one JSON
+record per game with its players, board and suggestion history. Lobby ids
+are given out again once archived (see models.lobby_id), so a record is
+identified by its archive_id, not its lobby_id. Every batch
+appends one gzip member, which gzip readers see as a single stream (see
+read_archive). Records are written before the rows are deleted, so a run
+that fails halfway may archive a game twice, never lose it.
+
+On SQLite the freed pages are given back with an incremental vacuum. Files
+created before auto_vacuum was turned on need one full VACUUM first:
+
+    python archive.py --vacuum
+
+Run once by hand with `python archive.py`.
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy import text, tuple_
+
+from extensions import db, socketio
+from models import Board, Lobby, Player, Suggestion, game_states, lobby_ids
+from models.types import to_plain
+from matchmaking import lobby_index
+from cluster import lobby_router
+from commands import lobby_commands
+from bots import bot_players
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+LIVE_STATUSES = ("waiting", "in_progress")
+ENDED_STATUSES = ("finished", "abandoned")
+
+
+def read_archive(path):
+    """Iterate over the game records of an archive file"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+class GameArchiver:
+    """Moves the games that are over from the database to archive files"""
+
+    def __init__(self):
+        self.app = None
+        self.interval = 300.0
+        self.idle_ttl = 86400.0
+        self.finished_ttl = 600.0
+        self.batch_size = 200
+        self.directory = "archive"
+        self.vacuum_pages = 2000
+        self._lock = threading.Lock()
+        self._started = False
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get("ARCHIVE_INTERVAL", 300.0)
+        self.idle_ttl = app.config.get("ARCHIVE_IDLE_TTL", 86400.0)
+        self.finished_ttl = app.config.get("ARCHIVE_FINISHED_TTL", 600.0)
+        self.batch_size = app.config.get("ARCHIVE_BATCH_SIZE", 200)
+        self.directory = app.config.get("ARCHIVE_DIR", os.path.join(app.instance_path, "archive"))
+        self.vacuum_pages = app.config.get("SQLITE_VACUUM_PAGES", 2000)
+
+    def start(self):
+        """Start the background task archiving games every interval"""
+        if not self.interval:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._loop)
+
+    def _loop(self):
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                self.run()
+            except Exception:
+                logger.exception("Error archiving games")
+
+    def run(self, now=None):
+        """Archive every game that is over, returning how many were archived"""
+        now = time.time() if now is None else now
+        archived = 0
+        with self.app.app_context():
+            # Games over first, then anything idle
+            for cutoff, statuses in ((now - self.finished_ttl, ENDED_STATUSES), (now - self.idle_ttl, None)):
+                after = None
+                while True:
+                    lobbies = self._candidates(cutoff, after, statuses)
+                    if not lobbies:
+                        break
+                    # Read before the rows are deleted
+                    after = (lobbies[-1].last_active, lobbies[-1].id)
+                    archived += self._archive(lobbies, now)
+                    if len(lobbies) < self.batch_size:
+                        break
+            if archived:
+                self._vacuum()
+        if archived:
+            logger.info("Archived games", extra={"games": archived})
+        return archived
+
+    def _candidates(self, cutoff, after, statuses=None):
+        """The next batch of lobbies last active before cutoff, oldest first.
+
+        A range of ix_lobby_last_active, walked in batches keyed by
+        (last_active, id): lobbies often share a last_active, e.g. all those
+        given one by migration 0010.
+        """
+        query = Lobby.query.filter(Lobby.last_active < cutoff)
+        if after is not None:
+            query = query.filter(tuple_(Lobby.last_active, Lobby.id) > after)
+        if statuses:
+            query = query.filter(Lobby.status.in_(statuses))
+        return query.order_by(Lobby.last_active, Lobby.id).limit(self.batch_size).all()
+
+    def _archive(self, lobbies, now):
+        records = []
+        archived = []
+        for lobby in lobbies:
+            # Every worker archives the lobbies it owns
+            if not lobby_router.owns(lobby.id):
+                continue
+            if game_states.has(lobby.id):
+                # Idle but still in memory: end it like any game, then archive it
+                lobby_commands.run(lobby.id, self._abandon, lobby.id)
+                db.session.refresh(lobby)
+            status = "abandoned" if lobby.status in LIVE_STATUSES else lobby.status
+            records.append(self._record(lobby, status, now))
+            archived.append(lobby.id)
+        if not archived:
+            return 0
+
+        self._append(records, now)
+        self._delete(archived)
+        for lobby_id in archived:
+            lobby_index.remove(lobby_id)
+            lobby_ids.release(lobby_id)
+            # No game_over is sent for an abandoned game, so its bots are told to leave
+            bot_players.retire(lobby_id)
+        return len(archived)
+
+    def _abandon(self, lobby_id):
+        state = game_states.get(lobby_id)
+        if state is not None:
+            game_states.end_game(state, status="abandoned")
+
+    @staticmethod
+    def _record(lobby, status, now):
+        board = lobby.get_board()
+        return {
+            "archive_id": str(uuid.uuid4()),
+            "lobby_id": lobby.id,
+            "status": status,
+            "host": lobby.host,
+            "last_active": lobby.last_active,
+            "archived_at": now,
+            "auto_disprove": lobby.auto_disprove,
+            "turn_order": to_plain(lobby.turn_order),
+            "solution": to_plain(lobby.solution),
+            "characters": to_plain(lobby.characters),
+            "players": [
+                {
+                    "id": player.id,
+                    "name": player.name,
+                    "character": to_plain(player.character),
+                    "hand": player.hand,
+                    "eliminated": player.eliminated,
+                }
+                for player in lobby.players
+            ],
+            "board": {
+                "rooms": to_plain(board.rooms),
+                "hallways": to_plain(board.hallways),
+                "player_locations": to_plain(board.player_locations),
+            } if board else None,
+            "suggestions": [suggestion.to_dict() for suggestion in lobby.suggestions],
+        }
+
+    def _append(self, records, now):
+        os.makedirs(self.directory, exist_ok=True)
+        month = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).strftime("%Y-%m")
+        path = os.path.join(self.directory, f"games-{month}.jsonl.gz")
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with open(path, "ab") as f:
+            f.write(gzip.compress(lines.encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _delete(ids):
+        # Lobby and board reference each other, so unlink them first
+        try:
+            Lobby.query.filter(Lobby.id.in_(ids)).update({Lobby.board_id: None}, synchronize_session=False)
+            Board.query.filter(Board.lobby_id.in_(ids)).delete(synchronize_session=False)
+            Suggestion.query.filter(Suggestion.lobby_id.in_(ids)).delete(synchronize_session=False)
+            Player.query.filter(Player.lobby_id.in_(ids)).delete(synchronize_session=False)
+            Lobby.query.filter(Lobby.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _vacuum(self):
+        if db.engine.url.get_backend_name() != "sqlite":
+            # Server databases reclaim space on their own (e.g. autovacuum)
+            return
+        with db.engine.connect() as connection:
+            connection.execute(text(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})"))
+            connection.commit()
+
+
+game_archiver = GameArchiver()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive the finished games once")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="run a full VACUUM afterwards, which also turns on incremental vacuum for older SQLite files")
+    args = parser.parse_args(argv)
+
+    from main import app
+    # The archiver main.py set up, run as a script this module is __main__
+    from archive import game_archiver as archiver
+
+    print(f"Archived {archiver.run()} games to {archiver.directory}")
+    if args.vacuum:
+        with app.app_context(), db.engine.connect() as connection:
+            connection.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+            connection.execute(text("VACUUM"))
+        print("Vacuumed the database")
+
+
+if __name__ == "__main__":
+    main()
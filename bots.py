@@ -0,0 +1,395 @@
+"""Server-side bot players.
+
+A bot is an ordinary Socket.IO client of this server that happens to live in
+the same process: it connects, joins with join_lobby and plays through the
+same events as the browser, so the handlers cannot tell it from a human. Its
+packets are passed in memory rather than over a socket, by InProcessTransport.
+
+Every bot keeps an engine.deduction.Notebook, fed from suggestion_made,
+card_shown, cannot_disprove and suggestion_disproved, and accuses as soon as
+the notebook pins down the solution. Decisions take a few milliseconds.
+
+The bots of all the lobbies are driven by one background task, so they never
+run inside an event handler: the handlers only append the packets they emit
+to the bots' inboxes. Bots leave when their game ends, or when archive.py
+archives their lobby.
+"""
+import importlib.metadata
+import itertools
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask.testing import EnvironBuilder
+from socketio import packet
+
+from engine import BOARD_TOPOLOGY, CARD_NAMES, ENVELOPE, Notebook, card_bit, mask_to_cards, suggestion_mask
+from engine.cards import ROOM_MASK, SUSPECT_MASK, WEAPON_MASK
+from engine.topology import ROOM_CARD_NAMES
+from extensions import socketio
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+# Events a bot reacts to; the rest (chat, board deltas...) are dropped
+BOT_EVENTS = frozenset((
+    'lobby_joined', 'game_started', 'my_cards', 'turn_update', 'move_update', 'suggestion_made',
+    'card_shown', 'cannot_disprove', 'suggestion_disproved', 'game_over', 'error',
+))
+
+
+# python-socketio releases InProcessTransport was written against, from the
+# first with disconnect reasons up to the next major version
+SOCKETIO_VERSIONS = ((5, 12), (6, 0))
+
+
+def _socketio_version():
+    try:
+        version = importlib.metadata.version('python-socketio')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+    return tuple(int(part) for part in re.findall(r'\d+', version)[:2])
+
+
+def _random_card(mask, rng):
+    return rng.choice(mask_to_cards(mask))
+
+
+class BotPlayer:
+    """One bot seated in one lobby"""
+
+    def __init__(self, manager, lobby_id, name, rng):
+        self.manager = manager
+        self.lobby_id = lobby_id
+        self.name = name
+        self.rng = rng
+        self.eio_sid = uuid.uuid4().hex
+
+        self.player_id = None
+        self.hand = 0
+        self.notebook = None
+        self.hand_sizes = {}
+        # suggestion_idx -> (suggesting player id, card mask)
+        self.suggestions = {}
+        # Moves left to try this turn, best first
+        self.moves = []
+        self.in_room = False
+        self.my_turn = False
+        self.done = False
+
+        self.inbox = deque()
+        # (due time, event, data) sent once the think delay has passed
+        self.outbox = deque()
+
+    def send(self, event, **data):
+        data.setdefault('lobby_id', self.lobby_id)
+        data.setdefault('player_id', self.player_id)
+        self.outbox.append((time.monotonic() + self.manager.think_seconds, event, data))
+
+    def handle(self, event, data):
+        handler = getattr(self, 'on_' + event, None)
+        if handler is not None:
+            handler(data)
+
+    # Lobby
+
+    def on_lobby_joined(self, data):
+        if self.player_id is not None:
+            return
+        # lobby_joined is broadcast for every player who joins: ours is the
+        # first one carrying our name once we are in the room
+        names = {player['player_id']: player['name'] for player in data['players']}
+        if names.get(data['player_id']) == self.name:
+            self.player_id = data['player_id']
+            logger.info("Bot joined lobby", extra={"lobby_id": self.lobby_id, "player_id": self.player_id})
+
+    def on_game_started(self, data):
+        if self.player_id is None:
+            self.done = True
+            return
+        # Cards are dealt round-robin in turn order
+        order = [position['player_id'] for position in data['player_positions']]
+        per_player, extra = divmod(len(CARD_NAMES) - 3, len(order))
+        self.hand_sizes = {player_id: per_player + (seat < extra) for seat, player_id in enumerate(order)}
+        self.send('get_my_cards')
+        self.on_turn_update(dict(data, player_id=data['current_player_id']))
+
+    def on_my_cards(self, data):
+        if data['player_id'] != self.player_id:
+            return
+        self.hand = sum(card_bit(card) for card in data['cards'])
+        self.notebook = Notebook(self.player_id, self.hand, self.hand_sizes)
+        if self.my_turn:
+            # Our turn came before the cards
+            self.try_next_move()
+
+    # Our turn
+
+    def on_turn_update(self, data):
+        self.my_turn = data['player_id'] == self.player_id
+        if not self.my_turn:
+            return
+        self.in_room = bool(data.get('in_room'))
+        self.moves = self.rank_moves(data.get('valid_moves') or [])
+        if self.notebook is not None:
+            self.try_next_move()
+
+    def try_next_move(self):
+        solution = self.notebook.solution()
+        if solution:
+            suspect, weapon, room = solution
+            self.moves = []
+            self.send('make_accusation', suspect=suspect, weapon=weapon, room=room)
+        elif self.moves:
+            self.send('make_move', move=self.moves.pop(0))
+        elif self.in_room:
+            # Every way out is blocked: suggest where we stand
+            self.suggest()
+        else:
+            self.send('next_turn')
+
+    def rank_moves(self, moves):
+        """Rooms that may hold the crime first, then hallways leading to one"""
+        candidates = self.notebook.candidates(ROOM_MASK) if self.notebook else ROOM_MASK
+
+        def score(move):
+            if BOARD_TOPOLOGY.is_room(move):
+                return 3 if card_bit(ROOM_CARD_NAMES[move]) & candidates else 1
+            rooms = BOARD_TOPOLOGY.adjacent_rooms(move) if BOARD_TOPOLOGY.is_hallway(move) else ()
+            return 2 if any(card_bit(ROOM_CARD_NAMES[room]) & candidates for room in rooms) else 0
+
+        moves = list(moves)
+        self.rng.shuffle(moves)
+        return sorted(moves, key=score, reverse=True)
+
+    def on_move_update(self, data):
+        if data['player_id'] != self.player_id:
+            return
+        self.moves = []
+        if data.get('can_suggest'):
+            self.suggest()
+        else:
+            self.send('next_turn')
+
+    def suggest(self):
+        """Suggest the suspect and weapon we know least about.
+
+        A card that may still be in the envelope is the most informative; once
+        a category is solved, a card of our own hand makes that category
+        useless to the other players.
+        """
+        self.moves = []
+        cards = []
+        for category in (SUSPECT_MASK, WEAPON_MASK):
+            candidates = self.notebook.candidates(category)
+            if self.notebook.known[ENVELOPE] & category:
+                candidates = self.hand & category or candidates
+            cards.append(_random_card(candidates or category, self.rng))
+        self.send('make_suggestion', suspect=cards[0], weapon=cards[1])
+
+    def on_error(self, data):
+        if data.get('code') in ('INVALID_MOVE', 'MOVE_ERROR') and self.notebook is not None:
+            # Hallway taken since the turn started, try another way
+            self.try_next_move()
+            return
+        logger.warning("Bot got an error", extra={
+            "lobby_id": self.lobby_id, "player_id": self.player_id, "code": data.get('code')})
+        if data.get('code') in ('LOBBY_NOT_FOUND', 'LOBBY_FULL', 'GAME_IN_PROGRESS'):
+            self.done = True
+
+    # Suggestions
+
+    def on_suggestion_made(self, data):
+        mask = suggestion_mask(data['suspect'], data['weapon'], data['room'])
+        self.suggestions[data['suggestion_idx']] = (data['player_id'], mask)
+
+        if self.notebook is not None:
+            for player_id in data.get('auto_skipped') or ():
+                if player_id != self.player_id:
+                    self.notebook.cannot_disprove(player_id, mask)
+
+        if data.get('next_to_disprove') == self.player_id:
+            matching = mask_to_cards(self.hand & mask)
+            self.send(
+                'disprove_suggestion',
+                suggestion_idx=data['suggestion_idx'],
+                card_shown=self.rng.choice(matching) if matching else None,
+                is_suggested_character=data.get('is_suggested_character', False),
+            )
+
+    def on_card_shown(self, data):
+        if self.notebook is not None:
+            self.notebook.saw_card(data['shown_by'], data['card'])
+
+    def on_cannot_disprove(self, data):
+        suggestion = self.suggestions.get(data['suggestion_idx'])
+        if suggestion and self.notebook is not None and data['player_id'] != self.player_id:
+            self.notebook.cannot_disprove(data['player_id'], suggestion[1])
+
+    def on_suggestion_disproved(self, data):
+        suggestion = self.suggestions.get(data['suggestion_idx'])
+        if suggestion is None or self.notebook is None:
+            return
+        suggesting_player_id, mask = suggestion
+        # Our own suggestions were answered by card_shown
+        if self.player_id not in (suggesting_player_id, data['disproved_by']):
+            self.notebook.disproved(data['disproved_by'], mask)
+
+    def on_game_over(self, data):
+        self.done = True
+
+
+class InProcessTransport:
+    """Passes the packets of in-process clients to and from the Socket.IO server.
+
+    python-socketio has no public API for a client living in the server's
+    process, so this is the only code using its private methods: the
+    _handle_eio_* entry points of a socket, and the _send_packet and
+    _send_eio_packet it wraps to catch what is sent to the bots. Packets
+    for every other session go to the original functions. It only runs on
+    the python-socketio versions it was written for (SOCKETIO_VERSIONS);
+    elsewhere bots are unavailable rather than broken.
+    """
+
+    PRIVATE_METHODS = ('_handle_eio_connect', '_handle_eio_message', '_handle_eio_disconnect',
+                       '_send_packet', '_send_eio_packet')
+
+    def __init__(self, receive):
+        # Called with (eio_sid, encoded packet) for the sessions of clients
+        self.receive = receive
+        self.sessions = set()
+
+    @property
+    def supported(self):
+        version = _socketio_version()
+        low, high = SOCKETIO_VERSIONS
+        if version is None or not low <= version < high:
+            return False
+        server = socketio.server
+        return server is not None and all(hasattr(server, name) for name in self.PRIVATE_METHODS)
+
+    def connect(self, app, eio_sid):
+        """Open a session, as a browser connecting to /socket.io"""
+        self._install()
+        self.sessions.add(eio_sid)
+        environ = EnvironBuilder(app, path='/socket.io').get_environ()
+        environ['flask.app'] = app
+        socketio.server._handle_eio_connect(eio_sid, environ)
+        self.send(eio_sid, packet.CONNECT)
+
+    def send(self, eio_sid, packet_type, data=None):
+        # As if it came from the client's socket: with async handlers the
+        # event runs in its own task, not in the caller's
+        pkt = socketio.server.packet_class(packet_type, data=data, namespace='/')
+        socketio.server._handle_eio_message(eio_sid, pkt.encode())
+
+    def disconnect(self, eio_sid):
+        self.sessions.discard(eio_sid)
+        socketio.server._handle_eio_disconnect(eio_sid, socketio.server.reason.SERVER_DISCONNECT)
+
+    def _install(self):
+        """Route the packets sent to our sessions to receive"""
+        server = socketio.server
+        # Checked on every connect: something else (the test client) may
+        # have replaced the server's send functions since
+        if getattr(server._send_packet, 'transport', None) is self:
+            return
+        send_packet, send_eio_packet = server._send_packet, server._send_eio_packet
+
+        def _send_packet(eio_sid, pkt):
+            if eio_sid not in self.sessions:
+                return send_packet(eio_sid, pkt)
+            self.receive(eio_sid, pkt.encode())
+
+        def _send_eio_packet(eio_sid, eio_pkt):
+            if eio_sid not in self.sessions:
+                return send_eio_packet(eio_sid, eio_pkt)
+            self.receive(eio_sid, eio_pkt.data)
+
+        _send_packet.transport = self
+        server._send_packet = _send_packet
+        server._send_eio_packet = _send_eio_packet
+
+
+class BotManager:
+    """The bots of every lobby"""
+
+    def __init__(self):
+        self.app = None
+        self.bots = {}
+        self.think_seconds = 0.5
+        self.poll_interval = 0.05
+        self.transport = InProcessTransport(self._receive)
+        self._names = itertools.count(1)
+        self._lock = threading.Lock()
+        self._task = None
+
+    def init_app(self, app):
+        self.app = app
+        # Pause before each bot action, so humans can follow the game
+        self.think_seconds = app.config.get('BOT_THINK_SECONDS', self.think_seconds)
+        self.poll_interval = app.config.get('BOT_POLL_INTERVAL', self.poll_interval)
+
+    @property
+    def available(self):
+        """Whether bots can run with the installed python-socketio"""
+        return self.transport.supported
+
+    def add(self, lobby_id, rng=random):
+        """Seat a new bot in a lobby; it joins like any other player"""
+        if not self.available:
+            raise RuntimeError(f"Bots need python-socketio {SOCKETIO_VERSIONS[0]} to {SOCKETIO_VERSIONS[1]}")
+        bot = BotPlayer(self, lobby_id, f"Bot {next(self._names)}", rng)
+        with self._lock:
+            self.bots[bot.eio_sid] = bot
+            self.transport.connect(self.app, bot.eio_sid)
+            if self._task is None:
+                self._task = socketio.start_background_task(self._run)
+        bot.outbox.append((0, 'join_lobby', {'lobby_id': lobby_id, 'name': bot.name}))
+        return bot
+
+    def retire(self, lobby_id):
+        """Make the bots of a lobby leave, e.g. once it is archived.
+
+        They are disconnected by the bots' task, like at the end of a game.
+        """
+        for bot in list(self.bots.values()):
+            if bot.lobby_id == lobby_id:
+                bot.outbox.clear()
+                bot.done = True
+
+    def _receive(self, eio_sid, encoded):
+        # Called from the event handlers: only queue the packet
+        bot = self.bots.get(eio_sid)
+        if bot is None or not isinstance(encoded, str):
+            return
+        pkt = socketio.server.packet_class(encoded_packet=encoded)
+        if pkt.packet_type == packet.EVENT and pkt.data[0] in BOT_EVENTS:
+            bot.inbox.append((pkt.data[0], pkt.data[1] if len(pkt.data) > 1 else {}))
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            for bot in list(self.bots.values()):
+                while bot.inbox:
+                    event, data = bot.inbox.popleft()
+                    try:
+                        bot.handle(event, data)
+                    except Exception:
+                        logger.exception("Bot failed to handle %s", event, extra={"lobby_id": bot.lobby_id})
+                while bot.outbox and bot.outbox[0][0] <= now:
+                    _, event, data = bot.outbox.popleft()
+                    self.transport.send(bot.eio_sid, packet.EVENT, [event, data])
+                if bot.done and not bot.outbox:
+                    self.remove(bot)
+            socketio.sleep(self.poll_interval)
+
+    def remove(self, bot):
+        self.bots.pop(bot.eio_sid, None)
+        self.transport.disconnect(bot.eio_sid)
+
+
+bot_players = BotManager()
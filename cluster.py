@@ -0,0 +1,190 @@
+"""Running the server as several worker processes.
+
+Socket.IO rooms and the live games (models.game_states) only exist in the
+memory of one process. With CLUSTER_WORKERS above 1:
+
+- socketio reaches the other workers through SOCKETIO_MESSAGE_QUEUE, so an
+  emit to a lobby or a player gets to the sockets connected to any worker;
+- every lobby belongs to one worker, picked from its id (see lobby_owner),
+  and only that worker keeps its game in memory;
+- an event about a lobby received by another worker is forwarded to the
+  owner over the same queue and handled there, as if the socket was local.
+
+The load balancer still has to keep each socket on one worker (sticky
+sessions), as Socket.IO requires whatever the number of workers.
+
+SOCKETIO_MESSAGE_QUEUE is a redis:// URL, any URL Kombu supports, or
+local:// for LocalManager, which connects the servers of a single process.
+"""
+import functools
+import queue
+import threading
+import zlib
+from collections import defaultdict
+
+import flask
+import socketio as socketio_lib
+from flask.testing import EnvironBuilder
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+
+def lobby_owner(lobby_id, workers):
+    """Index of the worker a lobby belongs to, the same in every worker"""
+    return zlib.crc32(lobby_id.encode()) % workers
+
+
+class LocalManager(socketio_lib.PubSubManager):
+    """In-process stand-in for a message queue.
+
+    Every manager of the same channel in this process gets every message,
+    like the Redis clients of several workers would.
+    """
+
+    name = 'local'
+
+    _channels = defaultdict(list)
+    _channels_lock = threading.Lock()
+
+    def __init__(self, url='local://', channel='socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.queue = queue.Queue()
+
+    def initialize(self):
+        if not self.write_only:
+            with self._channels_lock:
+                self._channels[self.channel].append(self.queue)
+        super().initialize()
+
+    def _publish(self, data):
+        # Serialized, so nothing is shared with the subscribers
+        message = self.json.dumps(data)
+        with self._channels_lock:
+            subscribers = list(self._channels[self.channel])
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def _listen(self):
+        while True:
+            yield self.queue.get()
+
+
+class RoutingManagerMixin:
+    """Carry the events forwarded between workers on the socketio channel"""
+
+    router = None
+
+    def forward(self, worker_id, message):
+        self._publish(dict(message, method='forward', worker=worker_id, host_id=self.host_id))
+
+    def _listen(self):
+        for message in super()._listen():
+            data = message
+            if not isinstance(data, dict):
+                try:
+                    data = self.json.loads(message)
+                except ValueError:
+                    data = None
+            if isinstance(data, dict) and data.get('method') == 'forward':
+                if data['worker'] == self.router.worker_id:
+                    # Not in the listener, which has to keep delivering emits
+                    self.server.start_background_task(self.router.dispatch, data)
+                continue
+            yield message
+
+
+def make_client_manager(url, channel, router):
+    """The socketio client manager for a message queue URL"""
+    scheme = url.partition('://')[0]
+    if scheme == 'local':
+        base = LocalManager
+    elif scheme in ('redis', 'rediss', 'unix', 'valkey', 'valkeys'):
+        base = socketio_lib.RedisManager
+    else:
+        base = socketio_lib.KombuManager
+    manager_class = type(f'Routing{base.__name__}', (RoutingManagerMixin, base), {'router': router})
+    return manager_class(url, channel=channel)
+
+
+class LobbyRouter:
+    """Runs each lobby's events on the worker that owns the lobby"""
+
+    def __init__(self):
+        self.app = None
+        self.workers = 1
+        self.worker_id = 0
+        self.client_manager = None
+        self._handlers = {}
+
+    def init_app(self, app):
+        """Set up from the config, before socketio.init_app"""
+        self.app = app
+        self.workers = app.config.get('CLUSTER_WORKERS', 1)
+        self.worker_id = app.config.get('CLUSTER_WORKER_ID', 0)
+        url = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+
+        if not 0 <= self.worker_id < self.workers:
+            raise RuntimeError(f'CLUSTER_WORKER_ID must be between 0 and {self.workers - 1}')
+        if self.workers > 1 and not url:
+            raise RuntimeError('Several workers need a SOCKETIO_MESSAGE_QUEUE')
+        if url:
+            self.client_manager = make_client_manager(url, app.config.get('SOCKETIO_CHANNEL', 'clueless'), self)
+
+    def socketio_options(self):
+        """Keyword arguments for socketio.init_app"""
+        return {'client_manager': self.client_manager} if self.client_manager else {}
+
+    def owns(self, lobby_id):
+        return self.workers == 1 or lobby_owner(lobby_id, self.workers) == self.worker_id
+
+    def route(self, handler):
+        """Decorator running a lobby event handler on the lobby's owner.
+
+        The handler takes the event data, with the lobby in data['lobby_id'].
+        """
+        name = handler.__name__
+        if name in self._handlers:
+            raise ValueError(f'Handler {name} is already routed')
+        self._handlers[name] = handler
+
+        @functools.wraps(handler)
+        def wrapper(data):
+            lobby_id = data.get('lobby_id') if isinstance(data, dict) else None
+            if lobby_id is None or self.owns(lobby_id):
+                return handler(data)
+            self.forward(name, lobby_id, data)
+
+        return wrapper
+
+    def forward(self, name, lobby_id, data):
+        owner = lobby_owner(lobby_id, self.workers)
+        logger.debug("Forwarding event", extra={"lobby_id": lobby_id, "handler": name, "worker": owner})
+        self.client_manager.forward(owner, {
+            'handler': name,
+            'data': data,
+            'sid': flask.request.sid,
+            'namespace': flask.request.namespace,
+        })
+
+    def dispatch(self, message):
+        """Run a forwarded event, emitting to the socket that sent it"""
+        handler = self._handlers.get(message['handler'])
+        if handler is None:
+            logger.warning("Forwarded event has no handler", extra={"handler": message['handler']})
+            return
+
+        environ = EnvironBuilder(self.app, path='/socket.io').get_environ()
+        with self.app.request_context(environ):
+            # What flask_socketio's emit and join_room read; they reach the
+            # socket's own worker through the message queue
+            flask.request.sid = message['sid']
+            flask.request.namespace = message['namespace']
+            try:
+                handler(message['data'])
+            except Exception:
+                logger.exception("Error handling forwarded event", extra={"handler": message['handler']})
+
+
+lobby_router = LobbyRouter()
@@ -0,0 +1,81 @@
+"""Serialized execution of the events of each lobby.
+
+Socket.IO runs every event in its own thread (or green thread), so two
+players of a lobby may otherwise act on its game at the same time: two
+next_turn both advancing the turn, two moves into the same hallway. Here
+every lobby has its own queue of commands, run one at a time in the order
+they arrived, while the commands of different lobbies run in parallel.
+
+A command runs in the thread of the event that submitted it, once every
+command queued before it for the lobby has finished, so it keeps its
+request context and emits as usual.
+"""
+import functools
+import threading
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Lane:
+    """The queue of one lobby: tickets are served in the order they were taken"""
+
+    __slots__ = ("condition", "next_ticket", "serving", "users")
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.next_ticket = 0
+        self.serving = 0
+        self.users = 0
+
+
+class LobbyCommandQueue:
+    """Per-lobby FIFO serialization of commands"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lanes = {}
+
+    def run(self, lobby_id, command, *args, **kwargs):
+        """Run a command once the commands queued before it for the lobby are done"""
+        with self._lock:
+            lane = self._lanes.get(lobby_id)
+            if lane is None:
+                lane = self._lanes[lobby_id] = _Lane()
+            lane.users += 1
+            ticket = lane.next_ticket
+            lane.next_ticket += 1
+
+        try:
+            with lane.condition:
+                while lane.serving != ticket:
+                    lane.condition.wait()
+            return command(*args, **kwargs)
+        finally:
+            with lane.condition:
+                lane.serving += 1
+                lane.condition.notify_all()
+            with self._lock:
+                lane.users -= 1
+                # Lanes only live while a lobby has commands queued
+                if not lane.users:
+                    del self._lanes[lobby_id]
+
+    def serialized(self, handler):
+        """Decorator queueing an event handler behind the lobby's other events.
+
+        The handler takes the event data, with the lobby in data['lobby_id'].
+        """
+
+        @functools.wraps(handler)
+        def wrapper(data):
+            lobby_id = data.get('lobby_id') if isinstance(data, dict) else None
+            if lobby_id is None:
+                return handler(data)
+            return self.run(lobby_id, handler, data)
+
+        return wrapper
+
+
+lobby_commands = LobbyCommandQueue()
@@ -0,0 +1,10 @@
+from .topology import BoardTopology, BOARD_TOPOLOGY
+from .cards import Card, Deck, CARD_NAMES, card_bit, cards_to_mask, mask_to_cards, suggestion_mask
+from .game import Game, CHARACTERS, new_character, copy_state
+from .deduction import Notebook, ENVELOPE
+
+
+__all__ = ['BoardTopology', 'BOARD_TOPOLOGY', 'Card', 'Deck', 'CARD_NAMES', 'card_bit', 'cards_to_mask',
+           'mask_to_cards', 'suggestion_mask', 'Game', 'CHARACTERS', 'new_character', 'copy_state',
+           'Notebook', 'ENVELOPE']
+# The game rules, in plain Python: no Flask, no database.
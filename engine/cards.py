@@ -0,0 +1,141 @@
+import enum
+import random
+
+
+class Card(enum.IntEnum):
+    """The 21 cards of the game, numbered so that each one is a bit of a mask.
+
+    Hands, the solution and suggestions are sets of cards, stored as an int
+    with bit `1 << card` set for each card they hold. Whether a player can
+    disprove a suggestion is then `hand & suggestion`.
+    """
+
+    MISS_SCARLET = 0
+    COLONEL_MUSTARD = 1
+    MRS_WHITE = 2
+    MR_GREEN = 3
+    MRS_PEACOCK = 4
+    PROFESSOR_PLUM = 5
+
+    CANDLESTICK = 6
+    KNIFE = 7
+    LEAD_PIPE = 8
+    REVOLVER = 9
+    ROPE = 10
+    WRENCH = 11
+
+    KITCHEN = 12
+    BALLROOM = 13
+    CONSERVATORY = 14
+    DINING_ROOM = 15
+    LOUNGE = 16
+    HALL = 17
+    STUDY = 18
+    LIBRARY = 19
+    BILLIARD_ROOM = 20
+
+    @property
+    def label(self):
+        """The name shown to the players (e.g. "Lead Pipe")"""
+        return CARD_NAMES[self]
+
+    @property
+    def bit(self):
+        return 1 << self
+
+
+# Display names, indexed by Card
+CARD_NAMES = (
+    "Miss Scarlet",
+    "Colonel Mustard",
+    "Mrs. White",
+    "Mr. Green",
+    "Mrs. Peacock",
+    "Professor Plum",
+    "Candlestick",
+    "Knife",
+    "Lead Pipe",
+    "Revolver",
+    "Rope",
+    "Wrench",
+    "Kitchen",
+    "Ballroom",
+    "Conservatory",
+    "Dining Room",
+    "Lounge",
+    "Hall",
+    "Study",
+    "Library",
+    "Billiard Room",
+)
+
+CARD_BITS = {name: 1 << card for card, name in enumerate(CARD_NAMES)}
+
+SUSPECTS = tuple(Card)[Card.MISS_SCARLET:Card.CANDLESTICK]
+WEAPONS = tuple(Card)[Card.CANDLESTICK:Card.KITCHEN]
+ROOMS = tuple(Card)[Card.KITCHEN:]
+
+SUSPECT_MASK = sum(card.bit for card in SUSPECTS)
+WEAPON_MASK = sum(card.bit for card in WEAPONS)
+ROOM_MASK = sum(card.bit for card in ROOMS)
+ALL_CARDS = SUSPECT_MASK | WEAPON_MASK | ROOM_MASK
+
+
+def card_bit(name):
+    """The bit of a card given by name, 0 if there is no such card"""
+    return CARD_BITS.get(name, 0)
+
+
+def cards_to_mask(names):
+    mask = 0
+    for name in names:
+        mask |= card_bit(name)
+    return mask
+
+
+def mask_to_cards(mask):
+    """The names of the cards of a mask, in card order"""
+    return [CARD_NAMES[card] for card in range(len(CARD_NAMES)) if mask >> card & 1]
+
+
+def suggestion_mask(suspect, weapon, room):
+    """The mask of the three cards named by a suggestion or an accusation"""
+    return card_bit(suspect) | card_bit(weapon) | card_bit(room)
+
+
+class Deck:
+    """The deck of one game: draws the solution, then deals the rest"""
+
+    __slots__ = ("rng", "remaining")
+
+    def __init__(self, rng=random):
+        self.rng = rng
+        # Cards not drawn yet
+        self.remaining = ALL_CARDS
+
+    def get_solution(self):
+        # Randomly select one card from each category
+        suspect = self.rng.choice(SUSPECTS)
+        weapon = self.rng.choice(WEAPONS)
+        room = self.rng.choice(ROOMS)
+
+        # The solution cards are not dealt
+        self.remaining &= ~(suspect.bit | weapon.bit | room.bit)
+
+        return {
+            "suspect": suspect.label,
+            "weapon": weapon.label,
+            "room": room.label
+        }
+
+    def deal_hands(self, player_ids):
+        """Shuffle the remaining cards and deal them round-robin, as hand masks"""
+        deck = [card for card in range(len(CARD_NAMES)) if self.remaining >> card & 1]
+        self.rng.shuffle(deck)
+
+        hands = [0] * len(player_ids)
+        for i, card in enumerate(deck):
+            hands[i % len(player_ids)] |= 1 << card
+        self.remaining = 0
+
+        return dict(zip(player_ids, hands))
@@ -0,0 +1,125 @@
+from .cards import ALL_CARDS, CARD_NAMES, ROOM_MASK, SUSPECT_MASK, WEAPON_MASK, card_bit
+
+CATEGORIES = (SUSPECT_MASK, WEAPON_MASK, ROOM_MASK)
+
+# Holder of the three solution cards, next to the players
+ENVELOPE = None
+
+
+def _count(mask):
+    return bin(mask).count("1")
+
+
+def _single(mask):
+    return mask and not mask & (mask - 1)
+
+
+class Notebook:
+    """What one player can deduce about where every card is.
+
+    For each holder (every player, and the ENVELOPE) it keeps the mask of
+    the cards it is known to hold and the mask of those it may hold. The
+    observations narrow these down, and propagate() applies the rules until
+    nothing changes:
+
+    - a card has exactly one holder;
+    - a player holds exactly their hand size, the envelope one card of each
+      category;
+    - a player who disproved a suggestion holds at least one of its cards.
+    """
+
+    __slots__ = ("player_id", "hand_sizes", "known", "possible", "clauses")
+
+    def __init__(self, player_id, hand, hand_sizes):
+        """hand_sizes maps every player id (including ours) to their number of cards"""
+        self.player_id = player_id
+        self.hand_sizes = dict(hand_sizes)
+        holders = list(self.hand_sizes) + [ENVELOPE]
+
+        self.known = dict.fromkeys(holders, 0)
+        self.possible = dict.fromkeys(holders, ALL_CARDS & ~hand)
+        self.known[player_id] = hand
+        self.possible[player_id] = hand
+
+        # (player_id, mask): the player holds at least one card of the mask
+        self.clauses = []
+        self.propagate()
+
+    def saw_card(self, player_id, card):
+        """A card was shown to us"""
+        self.known[player_id] |= card_bit(card)
+        self.propagate()
+
+    def cannot_disprove(self, player_id, mask):
+        """A player holds none of the cards of a suggestion"""
+        self.possible[player_id] &= ~mask
+        self.propagate()
+
+    def disproved(self, player_id, mask):
+        """A player showed someone else one of the cards of a suggestion"""
+        self.clauses.append((player_id, mask))
+        self.propagate()
+
+    def propagate(self):
+        known, possible = self.known, self.possible
+        changed = True
+        while changed:
+            changed = False
+
+            # A card known to be somewhere is nowhere else
+            for holder, held in known.items():
+                for other in possible:
+                    if other != holder and possible[other] & held:
+                        possible[other] &= ~held
+                        changed = True
+
+            # A card that only one holder may have is theirs
+            for card in range(len(CARD_NAMES)):
+                bit = 1 << card
+                holders = [holder for holder, mask in possible.items() if mask & bit]
+                if len(holders) == 1 and not known[holders[0]] & bit:
+                    known[holders[0]] |= bit
+                    changed = True
+
+            # Hand sizes
+            for player_id, size in self.hand_sizes.items():
+                if possible[player_id] != known[player_id]:
+                    if _count(known[player_id]) >= size:
+                        possible[player_id] = known[player_id]
+                        changed = True
+                    elif _count(possible[player_id]) <= size:
+                        known[player_id] = possible[player_id]
+                        changed = True
+
+            # The envelope holds one card of each category
+            for category in CATEGORIES:
+                held = known[ENVELOPE] & category
+                if held and possible[ENVELOPE] & category != held:
+                    possible[ENVELOPE] = possible[ENVELOPE] & ~category | held
+                    changed = True
+                elif not held and _single(possible[ENVELOPE] & category):
+                    known[ENVELOPE] |= possible[ENVELOPE] & category
+                    changed = True
+
+            # Disproved suggestions: one of the cards the player may hold
+            remaining = []
+            for player_id, mask in self.clauses:
+                mask &= possible[player_id]
+                if mask & known[player_id]:
+                    continue
+                if _single(mask):
+                    known[player_id] |= mask
+                    changed = True
+                    continue
+                remaining.append((player_id, mask))
+            self.clauses = remaining
+
+    def solution(self):
+        """The names of the solution cards, once they are all deduced"""
+        if _count(self.known[ENVELOPE]) != len(CATEGORIES):
+            return None
+        return [CARD_NAMES[(self.known[ENVELOPE] & category).bit_length() - 1] for category in CATEGORIES]
+
+    def candidates(self, category):
+        """Mask of the cards of a category that may still be in the envelope"""
+        return self.possible[ENVELOPE] & category
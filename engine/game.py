@@ -0,0 +1,510 @@
+import datetime
+import random
+
+from .cards import Deck, ROOM_MASK, SUSPECT_MASK, WEAPON_MASK, card_bit, mask_to_cards, suggestion_mask
+from .topology import BOARD_TOPOLOGY, CHARACTER_CARD_NAMES, HALLWAY_ROOMS, ROOMS, ROOM_CARD_NAMES, START_HALLWAYS
+
+
+# Playable characters, in the order they are listed in a lobby
+CHARACTERS = tuple(START_HALLWAYS)
+
+
+def new_character(name):
+    """A character on its start square"""
+    return {"name": name, "position": "start", "type": "starter", "selected": False}
+
+
+def copy_state(value):
+    """Deep copy the dicts and lists of a game state"""
+    if isinstance(value, dict):
+        return {key: copy_state(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_state(item) for item in value]
+    return value
+
+
+class Game:
+    """The rules of a game of Clue-Less, on plain Python data.
+
+    Players are dicts with the keys id, name, character, hand (a Card mask)
+    and eliminated. The board is kept as the rooms and hallways occupancy
+    maps plus the reverse index player_locations. Nothing here touches Flask
+    or the database, so games can be played in bulk without a server; the
+    server persists them through models.GameState.
+    """
+
+    __slots__ = (
+        "lobby_id", "host", "status", "current_turn_idx", "auto_disprove",
+        "turn_order", "players", "solution", "solution_mask", "suggestions",
+        "_dirty_suggestions", "rooms", "hallways", "player_locations",
+        "positions_version", "_positions_cache", "seq", "_moved_players", "version",
+    )
+
+    def __init__(self, lobby_id, host, status, current_turn_idx,
+                 players, solution, suggestions, rooms, hallways, player_locations,
+                 auto_disprove=False, version=0):
+        self.lobby_id = lobby_id
+        self.host = host
+        self.status = status
+        self.current_turn_idx = current_turn_idx
+        self.auto_disprove = auto_disprove
+
+        # Player states in turn order
+        self.turn_order = [player["id"] for player in players]
+        self.players = {player["id"]: player for player in players}
+
+        self.solution = solution
+        self.solution_mask = suggestion_mask(**solution) if solution else 0
+        self.suggestions = suggestions
+        # Indexes of the suggestions added or changed since the last snapshot
+        self._dirty_suggestions = set()
+        self.rooms = rooms
+        self.hallways = hallways
+        self.player_locations = player_locations
+
+        # Bumped whenever a player changes position, see player_positions
+        self.positions_version = 0
+        self._positions_cache = None
+
+        # Sequence number of the last update sent to the clients, and the
+        # players that moved since then, see take_delta
+        self.seq = 0
+        self._moved_players = {}
+
+        # Number of snapshots taken, persisted with them so that a snapshot
+        # older than the stored state is never written over it
+        self.version = version
+
+    @classmethod
+    def new(cls, lobby_id, host, players, characters=CHARACTERS, rng=random, auto_disprove=False):
+        """Set up a game: shuffle the turn order, draw the solution, deal the
+        hands and give every player a random character from `characters`.
+
+        `players` are dicts with at least an id and a name.
+        """
+        if len(characters) < len(players):
+            raise ValueError("Not enough characters available for all players.")
+
+        available = list(characters)
+        states = []
+        for player in players:
+            name = rng.choice(available)
+            available.remove(name)
+            character = new_character(name)
+            character["selected"] = True
+            states.append({
+                "id": player["id"],
+                "name": player["name"],
+                "character": character,
+                "hand": 0,
+                "eliminated": False,
+            })
+        rng.shuffle(states)
+
+        deck = Deck(rng)
+        solution = deck.get_solution()
+        hands = deck.deal_hands([player["id"] for player in states])
+        for player in states:
+            player["hand"] = hands[player["id"]]
+
+        return cls(
+            lobby_id=lobby_id,
+            host=host,
+            status="in_progress",
+            current_turn_idx=0,
+            players=states,
+            solution=solution,
+            suggestions=[],
+            rooms={room: [] for room in ROOMS},
+            hallways={hallway: None for hallway in HALLWAY_ROOMS},
+            player_locations={},
+            auto_disprove=auto_disprove,
+        )
+
+    def snapshot(self):
+        """Copy the mutable part of the state into plain dicts and lists.
+
+        Only the suggestions changed since the previous snapshot are included,
+        as {idx: suggestion}.
+        """
+        suggestions = {idx: dict(self.suggestions[idx]) for idx in sorted(self._dirty_suggestions)}
+        self._dirty_suggestions.clear()
+        self.version += 1
+        return {
+            "lobby_id": self.lobby_id,
+            "version": self.version,
+            "status": self.status,
+            "current_turn_idx": self.current_turn_idx,
+            "turn_order": list(self.turn_order),
+            "suggestion_count": len(self.suggestions),
+            "suggestions": suggestions,
+            "rooms": copy_state(self.rooms),
+            "hallways": copy_state(self.hallways),
+            "player_locations": copy_state(self.player_locations),
+            "players": {
+                player_id: {
+                    "character": copy_state(player["character"]),
+                    "hand": player["hand"],
+                    "eliminated": player["eliminated"],
+                }
+                for player_id, player in self.players.items()
+            },
+        }
+
+    def get_player(self, player_id):
+        return self.players.get(player_id)
+
+    def get_ordered_players(self):
+        return [self.players[player_id] for player_id in self.turn_order]
+
+    def current_player(self):
+        if not self.turn_order:
+            return None
+        return self.players[self.turn_order[self.current_turn_idx]]
+
+    def next_turn(self):
+        self._close_suggestion()
+        if self.turn_order:
+            self.current_turn_idx = (self.current_turn_idx + 1) % len(self.turn_order)
+            return self.current_player()
+        return None
+
+    def player_positions(self):
+        """Get the position of every player, as broadcast to the clients.
+
+        The list is built once per positions_version and shared by every
+        broadcast until a player moves, so callers must not modify it.
+        """
+        cached = self._positions_cache
+        if cached is None or cached[0] != self.positions_version:
+            cached = (self.positions_version, self._build_player_positions())
+            self._positions_cache = cached
+        return cached[1]
+
+    def _build_player_positions(self):
+        positions = []
+        for player in self.get_ordered_players():
+            character = player["character"] or {}
+            positions.append({
+                "player_id": player["id"],
+                "name": player["name"],
+                "character": character.get("name", "Unknown"),
+                "position": character.get("position", "Unknown"),
+                "position_type": character.get("type", "Unknown"),
+            })
+        return positions
+
+    def take_delta(self):
+        """Start the next update sent to the clients.
+
+        Returns the new sequence number along with the positions of the
+        players that moved since the previous update. A client that sees a
+        sequence number other than the one following its last asks for the
+        full board state instead (see get_board_state).
+        """
+        positions = {position["player_id"]: position for position in self.player_positions()}
+        changes = [positions[player_id] for player_id in self._moved_players]
+        self._moved_players = {}
+        self.seq += 1
+        return {"seq": self.seq, "position_changes": changes}
+
+    def board_state(self):
+        """Full snapshot of what the clients render, at the current sequence number"""
+        current_player = self.current_player()
+        return {
+            "seq": self.seq,
+            "player_positions": self.player_positions(),
+            "current_player_id": current_player["id"] if current_player else None,
+            "current_player_name": current_player["name"] if current_player else None,
+        }
+
+    def find_player_on_board(self, player_id):
+        return self.player_locations.get(player_id)
+
+    def current_room(self, player_id):
+        """Get the room the player is in, or None if they are not in a room"""
+        location = self.find_player_on_board(player_id)
+        if location and location["type"] == "room":
+            return location["location"]
+        return None
+
+    def is_valid_move(self, player_id, destination):
+        player = self.get_player(player_id)
+        if not player:
+            return {"result": False, "message": "Player not found"}
+
+        current_position = player["character"]["position"]
+        current_location = self.find_player_on_board(player_id)
+
+        # A player on their start square may enter any unoccupied hallway
+        if current_position == "start":
+            if BOARD_TOPOLOGY.is_hallway(destination) and self.hallways[destination] is None:
+                return {"result": True, "type": "hallway"}
+            return {"result": False, "message": "Invalid move"}
+
+        # Only one player can be in a hallway at a time
+        if BOARD_TOPOLOGY.is_hallway(destination) and self.hallways[destination] is not None:
+            return {"result": False, "message": "Destination hallway is occupied"}
+
+        if current_location is None:
+            return {"result": False, "message": "Invalid move"}
+
+        # From a room, move to an adjacent hallway
+        if current_location["type"] == "room":
+            return {
+                "result": destination in BOARD_TOPOLOGY.adjacent_hallways(current_location["location"]),
+                "type": "hallway",
+            }
+
+        # From a hallway, move to an adjacent room
+        return {
+            "result": destination in BOARD_TOPOLOGY.adjacent_rooms(current_location["location"]),
+            "type": "room",
+        }
+
+    def available_moves(self, player_id):
+        player = self.get_player(player_id)
+        if not player or not player["character"]:
+            return None
+
+        location = self.find_player_on_board(player_id)
+
+        if location is None:
+            if player["character"]["position"] == "start":
+                start_hallway = BOARD_TOPOLOGY.start_hallway(player["character"]["name"])
+                if start_hallway:
+                    return [start_hallway]
+            return None
+
+        if location["type"] == "room":
+            return list(BOARD_TOPOLOGY.adjacent_hallways(location["location"]))
+        return list(BOARD_TOPOLOGY.adjacent_rooms(location["location"]))
+
+    def _place_player(self, player_id, new_location):
+        """Put a player on a board location without checking the move rules"""
+        if BOARD_TOPOLOGY.is_room(new_location):
+            new_entry = {"type": "room", "location": new_location}
+        elif BOARD_TOPOLOGY.is_hallway(new_location):
+            new_entry = {"type": "hallway", "location": new_location}
+        else:
+            raise ValueError(f"Invalid new location: {new_location}")
+
+        current_location = self.player_locations.get(player_id)
+        if current_location:
+            if current_location["type"] == "room":
+                self.rooms[current_location["location"]].remove(player_id)
+            else:
+                self.hallways[current_location["location"]] = None
+
+        if new_entry["type"] == "room":
+            self.rooms[new_location].append(player_id)
+        else:
+            self.hallways[new_location] = player_id
+        self.player_locations[player_id] = new_entry
+
+        character = self.players[player_id]["character"]
+        character["position"] = new_location
+        character["type"] = new_entry["type"]
+        self.positions_version += 1
+        self._moved_players[player_id] = True
+
+    def move_player(self, player_id, new_location):
+        """Move a player to a new location, following the move rules"""
+        valid_move = self.is_valid_move(player_id, new_location)
+        if not valid_move["result"]:
+            raise ValueError("Invalid move")
+
+        self._place_player(player_id, new_location)
+        return True
+
+    def find_player_by_character(self, character_name):
+        for player in self.get_ordered_players():
+            if player["character"] and player["character"].get("name") == character_name:
+                return player
+        return None
+
+    def find_player_by_suspect(self, suspect):
+        """The player of the character a suspect card names, if anyone plays it"""
+        for player in self.get_ordered_players():
+            if player["character"] and CHARACTER_CARD_NAMES.get(player["character"].get("name")) == suspect:
+                return player
+        return None
+
+    def make_suggestion(self, player_id, suspect, weapon):
+        """Record a suggestion and move the suggested suspect into the room"""
+        current_player = self.current_player()
+        if current_player is None or current_player["id"] != player_id:
+            raise ValueError("Not your turn")
+
+        board_room = self.current_room(player_id)
+        if board_room is None:
+            raise ValueError("You must be in a room to make a suggestion")
+
+        room = ROOM_CARD_NAMES.get(board_room, board_room.capitalize())
+        suggestion = {
+            "player_id": player_id,
+            "suspect": suspect,
+            "weapon": weapon,
+            "room": room,
+            "mask": suggestion_mask(suspect, weapon, room),
+            "disproved_by": None,
+            "card_shown": None,
+            "timestamp": str(datetime.datetime.now())
+        }
+        # The first player asked to disprove, see pass_suggestion
+        order = self.disproval_order(suggestion)
+        suggestion["next_disprover"] = order[0] if order else None
+        self.suggestions.append(suggestion)
+        self._dirty_suggestions.add(len(self.suggestions) - 1)
+
+        # The suggested suspect is teleported into the room, if someone plays it
+        suspect_player = self.find_player_by_suspect(suspect)
+        if suspect_player:
+            self._place_player(suspect_player["id"], board_room)
+            return suggestion, suspect_player["id"]
+
+        return suggestion, None
+
+    def open_suggestion(self, suggestion_idx, player_id):
+        """The suggestion a player answers, checking that it is theirs to answer.
+
+        Only the latest suggestion can be answered, until it is disproved or
+        the turn ends, and only by the player whose turn it is to disprove
+        it (next_disprover). Raises ValueError otherwise.
+        """
+        if not 0 <= suggestion_idx < len(self.suggestions):
+            raise ValueError("Invalid suggestion index")
+        suggestion = self.suggestions[suggestion_idx]
+        if suggestion["disproved_by"] is not None:
+            raise ValueError("This suggestion has already been disproved")
+        if suggestion_idx != len(self.suggestions) - 1 or suggestion.get("next_disprover") is None:
+            raise ValueError("This suggestion is closed")
+        if suggestion["next_disprover"] != player_id:
+            raise ValueError("It is not your turn to disprove this suggestion")
+        return suggestion
+
+    def check_suggestion(self, suggestion_idx, player_id, card_shown):
+        """Process a player's response to a suggestion."""
+        suggestion = self.open_suggestion(suggestion_idx, player_id)
+
+        player = self.get_player(player_id)
+        if not player:
+            raise ValueError("Player not found")
+
+        shown_bit = card_bit(card_shown)
+        if not player["hand"] & shown_bit:
+            raise ValueError("You don't have this card")
+
+        if not suggestion["mask"] & shown_bit:
+            raise ValueError("Card does not match any part of the suggestion")
+
+        # The card itself stays private between suggester and disprover
+        suggestion["disproved_by"] = player_id
+        suggestion["card_shown"] = True
+        suggestion["next_disprover"] = None
+        self._dirty_suggestions.add(suggestion_idx)
+        return suggestion
+
+    def pass_suggestion(self, suggestion_idx, player_id):
+        """Record that a player cannot disprove a suggestion.
+
+        Returns the next player to ask, in disproval_order, or None once
+        everyone has passed, which closes the suggestion.
+        """
+        suggestion = self.open_suggestion(suggestion_idx, player_id)
+        order = self.disproval_order(suggestion)
+        position = order.index(player_id) + 1
+        suggestion["next_disprover"] = order[position] if position < len(order) else None
+        self._dirty_suggestions.add(suggestion_idx)
+        return suggestion["next_disprover"]
+
+    def _close_suggestion(self):
+        """Stop waiting on the latest suggestion, e.g. when the turn ends"""
+        if self.suggestions and self.suggestions[-1].get("next_disprover") is not None:
+            self.suggestions[-1]["next_disprover"] = None
+            self._dirty_suggestions.add(len(self.suggestions) - 1)
+
+    def get_suggestions(self, offset=0, limit=None):
+        """Get a page of the suggestion history, oldest first"""
+        end = None if limit is None else offset + limit
+        return [
+            dict(suggestion, suggestion_idx=idx)
+            for idx, suggestion in enumerate(self.suggestions[offset:end], start=offset)
+        ]
+
+    def make_accusation(self, player_id, suspect, weapon, room):
+        """Check if a player's accusation is correct.
+
+        Each name is compared with the solution card of its own category, so
+        the accusation is only correct with the right suspect, weapon and room.
+        """
+        is_correct = True
+        for kind, name, category in (("suspect", suspect, SUSPECT_MASK),
+                                     ("weapon", weapon, WEAPON_MASK),
+                                     ("room", room, ROOM_MASK)):
+            bit = card_bit(name) & category
+            if not bit:
+                raise ValueError(f"Unknown {kind}: {name}")
+            is_correct = is_correct and bit == self.solution_mask & category
+
+        return {
+            "is_correct": is_correct,
+            "accused": {
+                "suspect": suspect,
+                "weapon": weapon,
+                "room": room
+            },
+            "solution": self.solution
+        }
+
+    def disproval_order(self, suggestion):
+        """Players asked to disprove a suggestion, in order.
+
+        The player of the suggested character goes first, then everyone else
+        clockwise from the suggester.
+        """
+        suggester_id = suggestion["player_id"]
+        suspect_player = self.find_player_by_suspect(suggestion["suspect"])
+        first = suspect_player["id"] if suspect_player and suspect_player["id"] != suggester_id else None
+
+        start = self.turn_order.index(suggester_id) if suggester_id in self.turn_order else self.current_turn_idx
+        order = [first] if first else []
+        for offset in range(1, len(self.turn_order)):
+            player_id = self.turn_order[(start + offset) % len(self.turn_order)]
+            if player_id != first:
+                order.append(player_id)
+        return order
+
+    def resolve_disproval(self, suggestion):
+        """Find the first player who can disprove a suggestion, from the hands.
+
+        Returns (skipped, disprover_id, cards): the players before the
+        disprover, who hold none of the cards, then the disprover and the mask
+        of their matching cards. disprover_id is None if nobody can disprove.
+        The disprover becomes the suggestion's next_disprover.
+        """
+        # Called on the latest suggestion, as it is made
+        self._dirty_suggestions.add(len(self.suggestions) - 1)
+        skipped = []
+        for player_id in self.disproval_order(suggestion):
+            cards = self.disproving_cards(player_id, suggestion)
+            if cards:
+                suggestion["next_disprover"] = player_id
+                return skipped, player_id, cards
+            skipped.append(player_id)
+        suggestion["next_disprover"] = None
+        return skipped, None, 0
+
+    def player_cards(self, player_id):
+        """Names of a player's cards"""
+        return mask_to_cards(self.players[player_id]["hand"])
+
+    def disproving_cards(self, player_id, suggestion):
+        """Mask of the player's cards that disprove a suggestion"""
+        return self.players[player_id]["hand"] & suggestion["mask"]
+
+    def eliminate(self, player_id):
+        self.players[player_id]["eliminated"] = True
+
+    def active_players(self):
+        return [player for player in self.get_ordered_players() if not player["eliminated"]]
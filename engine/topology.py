@@ -0,0 +1,127 @@
+from types import MappingProxyType
+
+
+# Each hallway connects exactly two rooms. The hallway names are the ids used
+# by the client (templates/webLayout.html), so they are kept as-is even where
+# they abbreviate the room name ("billiard" -> "billiard_room").
+HALLWAY_ROOMS = {
+    "study_hall": ("study", "hall"),
+    "hall_lounge": ("hall", "lounge"),
+    "library_billiard": ("library", "billiard_room"),
+    "billiard_dining": ("billiard_room", "dining"),
+    "conservatory_ballroom": ("conservatory", "ballroom"),
+    "ballroom_kitchen": ("ballroom", "kitchen"),
+    "study_library": ("study", "library"),
+    "hall_billiard": ("hall", "billiard_room"),
+    "lounge_dining": ("lounge", "dining"),
+    "library_conservatory": ("library", "conservatory"),
+    "billiard_ballroom": ("billiard_room", "ballroom"),
+    "dining_kitchen": ("dining", "kitchen"),
+}
+
+ROOMS = (
+    "kitchen",
+    "ballroom",
+    "conservatory",
+    "dining",
+    "lounge",
+    "hall",
+    "study",
+    "library",
+    "billiard_room",
+)
+
+# Display name of the room card for each board room
+ROOM_CARD_NAMES = {
+    "kitchen": "Kitchen",
+    "ballroom": "Ballroom",
+    "conservatory": "Conservatory",
+    "dining": "Dining Room",
+    "lounge": "Lounge",
+    "hall": "Hall",
+    "study": "Study",
+    "library": "Library",
+    "billiard_room": "Billiard Room",
+}
+
+# Secret passages connect the corner rooms diagonally
+SECRET_PASSAGES = {
+    "study": "kitchen",
+    "lounge": "conservatory",
+    "conservatory": "lounge",
+    "kitchen": "study",
+}
+
+# The hallway each character's starting square opens onto
+START_HALLWAYS = {
+    "Miss Scarlet": "hall_lounge",
+    "Col. Mustard": "lounge_dining",
+    "Mrs. White": "ballroom_kitchen",
+    "Mr. Green": "conservatory_ballroom",
+    "Mrs. Peacock": "library_conservatory",
+    "Prof. Plum": "study_library",
+}
+
+# The suspect card naming each character
+CHARACTER_CARD_NAMES = {
+    "Miss Scarlet": "Miss Scarlet",
+    "Col. Mustard": "Colonel Mustard",
+    "Mrs. White": "Mrs. White",
+    "Mr. Green": "Mr. Green",
+    "Mrs. Peacock": "Mrs. Peacock",
+    "Prof. Plum": "Professor Plum",
+}
+
+
+class BoardTopology:
+    """Immutable adjacency index of the board, built once at import time."""
+
+    __slots__ = (
+        "rooms",
+        "hallways",
+        "room_hallways",
+        "hallway_rooms",
+        "secret_passages",
+        "start_hallways",
+    )
+
+    def __init__(self, rooms, hallway_rooms, secret_passages, start_hallways):
+        room_hallways = {room: [] for room in rooms}
+        for hallway, connected in hallway_rooms.items():
+            for room in connected:
+                room_hallways[room].append(hallway)
+
+        self.rooms = frozenset(rooms)
+        self.hallways = frozenset(hallway_rooms)
+        self.room_hallways = MappingProxyType(
+            {room: tuple(hallways) for room, hallways in room_hallways.items()}
+        )
+        self.hallway_rooms = MappingProxyType(dict(hallway_rooms))
+        self.secret_passages = MappingProxyType(dict(secret_passages))
+        self.start_hallways = MappingProxyType(dict(start_hallways))
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError("BoardTopology is immutable")
+        object.__setattr__(self, name, value)
+
+    def is_room(self, location):
+        return location in self.rooms
+
+    def is_hallway(self, location):
+        return location in self.hallways
+
+    def adjacent_hallways(self, room):
+        return self.room_hallways.get(room, ())
+
+    def adjacent_rooms(self, hallway):
+        return self.hallway_rooms.get(hallway, ())
+
+    def secret_passage(self, room):
+        return self.secret_passages.get(room)
+
+    def start_hallway(self, character_name):
+        return self.start_hallways.get(character_name)
+
+
+BOARD_TOPOLOGY = BoardTopology(ROOMS, HALLWAY_ROOMS, SECRET_PASSAGES, START_HALLWAYS)
@@ -1,6 +1,59 @@
 # extensions.py
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from metrics import packet_json
+
+# Relative SQLite paths are resolved in the app's instance folder
+DEFAULT_DATABASE_URL = 'sqlite:///game.db'
 
 db = SQLAlchemy()
-socketio = SocketIO()
+# Packets are encoded through the metrics so emitted payload sizes are recorded
+socketio = SocketIO(json=packet_json)
+
+
+def init_db(app):
+    """Set up the database connection pool for the configured URL.
+
+    DATABASE_POOL_SIZE connections are kept open, with up to
+    DATABASE_MAX_OVERFLOW more under load. SQLite files are switched to WAL
+    so the write-behind flusher does not block readers, and wait up to
+    SQLITE_BUSY_TIMEOUT milliseconds for a writer instead of failing.
+
+    Sessions are scoped to the app context, and Flask-SocketIO pushes one per
+    event: every handler gets its own session, closed (and its connection
+    returned to the pool) when the handler returns, whatever the async mode.
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    sqlite_file = url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+    if url.get_backend_name() != 'sqlite' or sqlite_file:
+        options.setdefault('pool_size', app.config.get('DATABASE_POOL_SIZE', 10))
+        options.setdefault('max_overflow', app.config.get('DATABASE_MAX_OVERFLOW', 20))
+    if url.get_backend_name() != 'sqlite':
+        # Drop connections the server closed while they sat in the pool
+        options.setdefault('pool_pre_ping', True)
+        options.setdefault('pool_recycle', 1800)
+
+    db.init_app(app)
+
+    if sqlite_file:
+        busy_timeout = int(app.config.get('SQLITE_BUSY_TIMEOUT', 5000))
+
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # Lets archive.py give freed pages back. Only applies to a new
+            # file, hence first, or after a full VACUUM
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Durable at each checkpoint rather than each commit, which WAL makes safe
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+            cursor.close()
+
+        with app.app_context():
+            event.listen(db.engine, "connect", set_sqlite_pragmas)
+
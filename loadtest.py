@@ -0,0 +1,339 @@
+"""Load test for the Socket.IO game flow.
+
+Plays many lobbies at the same time through Flask-SocketIO's test client,
+from host_lobby and join_lobby to the final accusation, and reports the
+latency percentiles of every event, the overall event rate, and the SQL
+statements and commits the server issued. Every other lobby plays with
+automatic disproval.
+
+Before the final accusation each game is flushed and its suggestion rows
+compared with the live game; the script exits with status 1 if any differ.
+
+    python loadtest.py --lobbies 200 --players 3-6 --turns 40
+
+The games run against a throwaway SQLite database (or DATABASE_URL if given
+with --database-url). They are interleaved one event at a time, so all the
+lobbies are live at once.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from engine.cards import SUSPECTS, WEAPONS
+
+
+def parse_players(value):
+    """Parse a player count such as "4" or a range such as "3-6" """
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class Stats:
+    """Latencies and SQL activity, per event"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statements = defaultdict(int)
+        self.commits = defaultdict(int)
+        self.turns = 0
+        self.games = 0
+        # Suggestion rows that differ from the live game, see check_persisted
+        self.mismatches = 0
+
+        # SQL issued by the thread running the games; the write-behind
+        # flusher runs in its own thread and is counted separately
+        self.main_thread = threading.get_ident()
+        self.current_statements = 0
+        self.current_commits = 0
+        self.background_statements = 0
+        self.background_commits = 0
+
+    def watch(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def count_statement(*args):
+            if threading.get_ident() == self.main_thread:
+                self.current_statements += 1
+            else:
+                self.background_statements += 1
+
+        @event.listens_for(engine, "commit")
+        def count_commit(*args):
+            if threading.get_ident() == self.main_thread:
+                self.current_commits += 1
+            else:
+                self.background_commits += 1
+
+    @contextlib.contextmanager
+    def measure(self, event_name):
+        statements, commits = self.current_statements, self.current_commits
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies[event_name].append(time.perf_counter() - start)
+            self.statements[event_name] += self.current_statements - statements
+            self.commits[event_name] += self.current_commits - commits
+
+    def report(self, elapsed):
+        events = sum(len(values) for values in self.latencies.values())
+        total_commits = sum(self.commits.values()) + self.background_commits
+        rows = []
+        for event_name, values in sorted(self.latencies.items()):
+            rows.append({
+                "event": event_name,
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "sql_per_event": self.statements[event_name] / len(values),
+                "commits_per_event": self.commits[event_name] / len(values),
+            })
+        return {
+            "games": self.games,
+            "turns": self.turns,
+            "events": events,
+            "elapsed_s": elapsed,
+            "events_per_s": events / elapsed if elapsed else 0.0,
+            "background_sql": self.background_statements,
+            "background_commits": self.background_commits,
+            "commits_per_turn": total_commits / self.turns if self.turns else 0.0,
+            "mismatched_suggestions": self.mismatches,
+            "per_event": rows,
+        }
+
+
+def print_report(report, out=sys.stdout):
+    print(f"{report['games']} games, {report['turns']} turns, {report['events']} events "
+          f"in {report['elapsed_s']:.2f}s ({report['events_per_s']:.0f} events/s)", file=out)
+    print(f"{'event':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'sql/ev':>9}{'commit/ev':>11}", file=out)
+    for row in report["per_event"]:
+        print(f"{row['event']:<22}{row['count']:>8}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['p99_ms']:>10.2f}{row['sql_per_event']:>9.2f}{row['commits_per_event']:>11.2f}", file=out)
+    print(f"write-behind flusher: {report['background_sql']} statements, "
+          f"{report['background_commits']} commits", file=out)
+    print(f"commits per turn: {report['commits_per_turn']:.2f}", file=out)
+    print(f"suggestion rows differing from the live games: {report['mismatched_suggestions']}", file=out)
+
+
+class SimulatedGame:
+    """One lobby played by simulated players.
+
+    run() is a generator that yields after every event, so the driver can
+    interleave many games.
+    """
+
+    def __init__(self, app, socketio, n_players, max_turns, stats, rng, auto_disprove=False):
+        self.app = app
+        self.socketio = socketio
+        self.n_players = n_players
+        self.max_turns = max_turns
+        self.auto_disprove = auto_disprove
+        self.stats = stats
+        self.rng = rng
+        self.clients = {}
+        self.cards = {}
+        self.lobby_id = None
+
+    def emit(self, player_id, event_name, data):
+        """Send an event as a player and return what every client received"""
+        with self.stats.measure(event_name):
+            self.clients[player_id].emit(event_name, data)
+        received = {pid: client.get_received() for pid, client in self.clients.items()}
+        return received
+
+    @staticmethod
+    def find(received, player_id, event_name):
+        for message in received.get(player_id, []):
+            if message["name"] == event_name:
+                return message["args"][0]
+        return None
+
+    def run(self):
+        http = self.app.test_client()
+        with self.stats.measure("host_lobby"):
+            response = http.post("/lobby/host", json={"name": "host", "auto_disprove": self.auto_disprove}).get_json()
+        self.lobby_id, host_id = response["lobby_id"], response["player_id"]
+        yield
+
+        self.clients[host_id] = self.socketio.test_client(self.app)
+        self.emit(host_id, "join_lobby", {"lobby_id": self.lobby_id, "player_id": host_id})
+        yield
+
+        for n in range(1, self.n_players):
+            client = self.socketio.test_client(self.app)
+            with self.stats.measure("join_lobby"):
+                client.emit("join_lobby", {"lobby_id": self.lobby_id, "name": f"player{n}"})
+            joined = [m for m in client.get_received() if m["name"] == "lobby_joined"]
+            self.clients[joined[-1]["args"][0]["player_id"]] = client
+            yield
+
+        received = self.emit(host_id, "start_game", {"lobby_id": self.lobby_id, "player_id": host_id})
+        started = self.find(received, host_id, "game_started")
+        yield
+
+        for player_id in self.clients:
+            received = self.emit(player_id, "get_my_cards", {"lobby_id": self.lobby_id, "player_id": player_id})
+            self.cards[player_id] = self.find(received, player_id, "my_cards")["cards"]
+            yield
+
+        current, moves = started["current_player_id"], started["valid_moves"] or []
+        for turn in range(self.max_turns):
+            self.stats.turns += 1
+            can_suggest = False
+            for move in self.rng.sample(moves, len(moves)):
+                received = self.emit(current, "make_move", {
+                    "lobby_id": self.lobby_id, "player_id": current, "move": move})
+                yield
+                moved = self.find(received, current, "move_update")
+                if moved:
+                    can_suggest = moved["can_suggest"]
+                    break
+
+            if can_suggest:
+                turn_update = yield from self.play_suggestion(current)
+            else:
+                received = self.emit(current, "next_turn", {"lobby_id": self.lobby_id, "player_id": current})
+                turn_update = self.find(received, current, "turn_update")
+                yield
+
+            current, moves = turn_update["player_id"], turn_update["valid_moves"] or []
+
+        # Close the case, so the end of a game is measured too
+        from models import game_states
+        state = game_states.get(self.lobby_id)
+        self.check_persisted(state)
+        solution = state.solution
+        self.emit(current, "make_accusation", {
+            "lobby_id": self.lobby_id, "player_id": current, **solution})
+        self.stats.games += 1
+        for client in self.clients.values():
+            client.disconnect()
+
+    def check_persisted(self, state):
+        """Flush the game and count the suggestion rows that differ from it"""
+        from models import Suggestion, game_states
+
+        game_states.flush([self.lobby_id])
+        with self.app.app_context():
+            rows = {row.idx: row.to_dict() for row in Suggestion.query.filter_by(lobby_id=self.lobby_id)}
+        for idx, suggestion in enumerate(state.suggestions):
+            row = rows.get(idx)
+            if row is None or any(row[key] != suggestion.get(key)
+                                  for key in ("disproved_by", "card_shown", "next_disprover")):
+                self.stats.mismatches += 1
+
+    def play_suggestion(self, player_id):
+        received = self.emit(player_id, "make_suggestion", {
+            "lobby_id": self.lobby_id,
+            "player_id": player_id,
+            "suspect": self.rng.choice(SUSPECTS).label,
+            "weapon": self.rng.choice(WEAPONS).label,
+        })
+        suggestion = self.find(received, player_id, "suggestion_made")
+        yield
+
+        while True:
+            disprover = suggestion["next_to_disprove"]
+            if disprover is None:
+                # Resolved by the server from the hands
+                return self.find(received, player_id, "turn_update")
+            matches = [card for card in self.cards[disprover]
+                       if card in (suggestion["suspect"], suggestion["weapon"], suggestion["room"])]
+            received = self.emit(disprover, "disprove_suggestion", {
+                "lobby_id": self.lobby_id,
+                "player_id": disprover,
+                "suggestion_idx": suggestion["suggestion_idx"],
+                "card_shown": self.rng.choice(matches) if matches else None,
+                "is_suggested_character": suggestion.get("is_suggested_character", False),
+            })
+            yield
+
+            turn_update = self.find(received, disprover, "turn_update")
+            if turn_update:
+                return turn_update
+            suggestion = self.find(received, disprover, "suggestion_made")
+
+
+def run(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        db_dir = tempfile.mkdtemp(prefix="clueless-loadtest-")
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(db_dir, "loadtest.db")
+
+    # A new database, given its schema by the migrations
+    os.environ["MIGRATE_ON_START"] = "1"
+    # Keep the report readable; set LOG_LEVEL to see the server's logs
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from main import app
+        from extensions import db, socketio
+        from models import game_states
+
+    game_states.flush_interval = args.flush_interval
+    stats = Stats()
+    with app.app_context():
+        stats.watch(db.engine)
+
+    rng = random.Random(args.seed)
+    low, high = args.players
+    games = [
+        SimulatedGame(app, socketio, rng.randint(low, high), args.turns, stats, rng, auto_disprove=n % 2 == 1).run()
+        for n in range(args.lobbies)
+    ]
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        while games:
+            for game in list(games):
+                try:
+                    next(game)
+                except StopIteration:
+                    games.remove(game)
+        game_states.flush()
+    elapsed = time.perf_counter() - start
+
+    return stats.report(elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Socket.IO game flow")
+    parser.add_argument("--lobbies", type=int, default=50, help="number of lobbies played at once")
+    parser.add_argument("--players", type=parse_players, default=(3, 6),
+                        help="players per lobby, a number or a range such as 3-6")
+    parser.add_argument("--turns", type=int, default=30, help="turns played before the winning accusation")
+    parser.add_argument("--flush-interval", type=float, default=2.0,
+                        help="seconds between write-behind flushes of the live games")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--database-url", default=None,
+                        help="database to run against (default: a temporary SQLite file)")
+    parser.add_argument("--json", dest="json_path", default=None,
+                        help="also write the report to this file, to compare runs")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["mismatched_suggestions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# logs.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import time
+
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Whether secret values (player hands, shown cards, the solution) are written
+# to the logs. Off by default, see init_logging.
+_show_secrets = False
+
+_listener = None
+
+
+def get_logger(name):
+    """Get the logger of a module, named after it (e.g. "routes.lobby")"""
+    return logging.getLogger(name)
+
+
+class Redacted:
+    """Wrap a secret value passed as a log argument.
+
+    The value is only rendered when the message is actually formatted, and
+    then only if LOG_SHOW_SECRETS is enabled.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        if _show_secrets:
+            return str(self.value)
+        if isinstance(self.value, (list, tuple, set, dict)):
+            return f"<redacted {len(self.value)} items>"
+        return "<redacted>"
+
+    __repr__ = __str__
+
+
+def redact(value):
+    return Redacted(value)
+
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as one JSON object per line.
+
+    Fields passed with `extra={...}` are added to the object, so handlers can
+    log e.g. the lobby and player ids as separate keys.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def _parse_levels(levels):
+    """Parse per-module levels given as a dict or as "routes=DEBUG,models.board=INFO" """
+    if isinstance(levels, dict):
+        return levels
+    parsed = {}
+    for item in (levels or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+
+def init_logging(app):
+    """Configure logging from the app config.
+
+    LOG_LEVEL is the default level, LOG_LEVELS overrides it per module (a dict
+    or "module=LEVEL,..."), LOG_SHOW_SECRETS disables redaction. Records are
+    handed to a queue and written by a background thread, so a handler only
+    pays for the log calls that pass its level check.
+    """
+    global _listener, _show_secrets
+
+    _show_secrets = bool(app.config.get("LOG_SHOW_SECRETS", False))
+
+    root = logging.getLogger()
+    root.setLevel(app.config.get("LOG_LEVEL", "INFO"))
+    for name, level in _parse_levels(app.config.get("LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level)
+
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(StructuredFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
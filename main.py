@@ -1,6 +1,15 @@
-from flask import Flask, render_template
-from extensions import db, socketio
-from routes.lobby import lobby_bp
+import os
+
+from flask import Flask, Response, render_template
+from extensions import DEFAULT_DATABASE_URL, db, init_db, socketio
+from metrics import handler_metrics
+from logs import init_logging
+from models import game_states, lobby_ids
+from routes.lobby import lobby_bp, load_lobby_index
+from bots import bot_players
+from cluster import lobby_router
+from archive import game_archiver
+from migrations import upgrade, require_current
 import routes.handlePlayerActions
 
 HOST = "0.0.0.0"
@@ -8,21 +17,81 @@ PORT = 5000
 
 app = Flask(__name__)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///game.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+# The schema is applied with `python -m migrations upgrade` and only checked
+# at startup; MIGRATE_ON_START=1 applies it instead, for development and
+# throwaway databases
+app.config['MIGRATE_ON_START'] = os.environ.get('MIGRATE_ON_START') == '1'
+# Connection pool, and how long SQLite waits for the write lock (ms)
+app.config['DATABASE_POOL_SIZE'] = int(os.environ.get('DATABASE_POOL_SIZE', '10'))
+app.config['DATABASE_MAX_OVERFLOW'] = int(os.environ.get('DATABASE_MAX_OVERFLOW', '20'))
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', '5000'))
+# threading, eventlet, gevent or gevent_uwsgi; "auto" picks the best one
+# installed. eventlet and gevent must be monkey patched first, see serve.py
+app.config['SOCKETIO_ASYNC_MODE'] = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')
+# Worker processes sharing the lobbies, this one's index, and the message
+# queue they talk through (e.g. redis://localhost:6379/0), see cluster.py
+app.config['CLUSTER_WORKERS'] = int(os.environ.get('CLUSTER_WORKERS', '1'))
+app.config['CLUSTER_WORKER_ID'] = int(os.environ.get('CLUSTER_WORKER_ID', '0'))
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+# Lobby ids reserved from the database at a time, and seconds before the
+# id of a deleted lobby is handed out again
+app.config['LOBBY_ID_BLOCK_SIZE'] = int(os.environ.get('LOBBY_ID_BLOCK_SIZE', '1000'))
+app.config['LOBBY_ID_COOLDOWN'] = float(os.environ.get('LOBBY_ID_COOLDOWN', '3600'))
+# Seconds between write-behind flushes of live games to the database
+app.config['GAME_STATE_FLUSH_INTERVAL'] = 2.0
+# Archival of games that are over (see archive.py): seconds between runs
+# (0 to turn it off), how long a finished game stays in the database, and
+# how long a lobby may sit untouched before it is archived as abandoned
+app.config['ARCHIVE_INTERVAL'] = float(os.environ.get('ARCHIVE_INTERVAL', '300'))
+app.config['ARCHIVE_FINISHED_TTL'] = float(os.environ.get('ARCHIVE_FINISHED_TTL', '600'))
+app.config['ARCHIVE_IDLE_TTL'] = float(os.environ.get('ARCHIVE_IDLE_TTL', '86400'))
+if os.environ.get('ARCHIVE_DIR'):
+    app.config['ARCHIVE_DIR'] = os.environ['ARCHIVE_DIR']
+# Default log level, per-module overrides ("routes=DEBUG,models.board=INFO"),
+# and whether card contents may appear in the logs
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+app.config['LOG_LEVELS'] = os.environ.get('LOG_LEVELS', '')
+app.config['LOG_SHOW_SECRETS'] = os.environ.get('LOG_SHOW_SECRETS') == '1'
+
+# Seconds a bot player waits before each of its actions
+app.config['BOT_THINK_SECONDS'] = float(os.environ.get('BOT_THINK_SECONDS', '0.5'))
+
+init_logging(app)
 
 
-db.init_app(app)
-socketio.init_app(app)
+init_db(app)
+lobby_router.init_app(app)
+async_mode = app.config['SOCKETIO_ASYNC_MODE']
+socketio.init_app(app, async_mode=None if async_mode == 'auto' else async_mode, **lobby_router.socketio_options())
+game_states.init_app(app)
+lobby_ids.init_app(app)
+game_archiver.init_app(app)
+handler_metrics.init_app(app, db)
+bot_players.init_app(app)
 
 with app.app_context():
-    db.create_all()
+    if app.config['MIGRATE_ON_START']:
+        upgrade(db.engine)
+    else:
+        require_current(db.engine)
+    load_lobby_index()
+    # So the first lobbies hosted do not wait for the database
+    lobby_ids.refill()
 
 @app.route('/test')
 def test():
     return render_template('webLayout.html')
 
+@app.route('/metrics')
+def metrics():
+    return Response(handler_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 app.register_blueprint(lobby_bp, url_prefix='/lobby')
 
+game_states.start_flusher()
+game_archiver.start()
+
 
 if __name__ == '__main__':
     socketio.run(app, host=HOST, port=PORT, debug=True)
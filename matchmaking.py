@@ -0,0 +1,142 @@
+"""In-memory index of the lobbies waiting for players.
+
+Lobbies are bucketed by their number of open seats, so quick_join finds the
+fullest joinable lobby by looking at a handful of buckets, and the lobby
+listing is served without touching the database. The index is kept in sync
+by the lobby handlers (a lobby is added when it is hosted, updated on every
+join and removed when its game starts) and rebuilt from the database with
+load() when the server starts.
+
+With several workers (see cluster.py) each worker indexes the lobbies it
+owns.
+"""
+import threading
+import time
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+
+class LobbyIndex:
+    """Waiting lobbies by number of open seats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # lobby_id -> listing entry
+        self._entries = {}
+        # open seats -> {lobby_id: None}, oldest lobby first
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, lobby_id, players, max_players, host_name=None, auto_disprove=False):
+        """Add a lobby, or record its new player count"""
+        with self._lock:
+            entry = self._entries.get(lobby_id)
+            if entry is None:
+                entry = self._entries[lobby_id] = {
+                    'lobby_id': lobby_id,
+                    'host_name': host_name,
+                    'auto_disprove': bool(auto_disprove),
+                    'created': time.time(),
+                    # Seats promised to quick_join calls still joining
+                    'claimed': 0,
+                }
+            else:
+                self._unbucket(entry)
+            entry['players'] = players
+            entry['max_players'] = max_players
+            self._bucket(entry)
+
+    def remove(self, lobby_id):
+        """Forget a lobby, e.g. once its game has started"""
+        with self._lock:
+            entry = self._entries.pop(lobby_id, None)
+            if entry is not None:
+                self._unbucket(entry)
+
+    def is_full(self, lobby_id):
+        """Whether the lobby is known to have every seat taken"""
+        with self._lock:
+            entry = self._entries.get(lobby_id)
+            return entry is not None and entry['players'] >= entry['max_players']
+
+    def claim(self, exclude=()):
+        """Reserve a seat in the fullest lobby that has one, oldest first.
+
+        Returns the lobby id, or None if no lobby has an open seat. The seat
+        is held until release() so that concurrent claims do not overbook.
+        """
+        with self._lock:
+            for seats in sorted(self._buckets):
+                if seats <= 0:
+                    continue
+                for lobby_id in self._buckets[seats]:
+                    if lobby_id not in exclude:
+                        entry = self._entries[lobby_id]
+                        self._unbucket(entry)
+                        entry['claimed'] += 1
+                        self._bucket(entry)
+                        return lobby_id
+        return None
+
+    def release(self, lobby_id):
+        """Give back a seat reserved by claim()"""
+        with self._lock:
+            entry = self._entries.get(lobby_id)
+            if entry is not None and entry['claimed']:
+                self._unbucket(entry)
+                entry['claimed'] -= 1
+                self._bucket(entry)
+
+    def listing(self, limit=50):
+        """Joinable lobbies, fullest first"""
+        lobbies = []
+        with self._lock:
+            for seats in sorted(self._buckets):
+                if seats <= 0:
+                    continue
+                for lobby_id in self._buckets[seats]:
+                    if len(lobbies) >= limit:
+                        return lobbies
+                    entry = self._entries[lobby_id]
+                    lobbies.append({
+                        'lobby_id': lobby_id,
+                        'host_name': entry['host_name'],
+                        'players': entry['players'],
+                        'max_players': entry['max_players'],
+                        'open_seats': seats,
+                        'auto_disprove': entry['auto_disprove'],
+                    })
+        return lobbies
+
+    def load(self, lobbies, max_players):
+        """Rebuild the index from (lobby_id, players, host_name, auto_disprove) rows"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+        for lobby_id, players, host_name, auto_disprove in lobbies:
+            self.update(lobby_id, players, max_players, host_name=host_name, auto_disprove=auto_disprove)
+        logger.info("Lobby index loaded", extra={"lobbies": len(self)})
+
+    # Called with the lock held
+
+    @staticmethod
+    def _open_seats(entry):
+        return entry['max_players'] - entry['players'] - entry['claimed']
+
+    def _bucket(self, entry):
+        self._buckets.setdefault(self._open_seats(entry), {})[entry['lobby_id']] = None
+
+    def _unbucket(self, entry):
+        seats = self._open_seats(entry)
+        bucket = self._buckets.get(seats)
+        if bucket is not None:
+            bucket.pop(entry['lobby_id'], None)
+            if not bucket:
+                del self._buckets[seats]
+
+
+lobby_index = LobbyIndex()
@@ -0,0 +1,163 @@
+# metrics.py
+import functools
+import json
+import threading
+import time
+
+from sqlalchemy import event
+
+
+# Upper bounds (seconds) of the handler latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Per-event counters, summed over every call of a handler
+COUNTERS = (
+    ("sql_statements", "SQL statements issued"),
+    ("commits", "Database commits"),
+    ("json_encodes", "JSON documents encoded"),
+    ("json_decodes", "JSON documents decoded"),
+    ("payload_bytes", "Bytes of Socket.IO payload emitted"),
+)
+
+
+class HandlerMetrics:
+    """In-process metrics of the Socket.IO handlers.
+
+    The handler being run in the current thread is tracked in a thread local,
+    so the SQL, JSON and emit hooks can attribute their work to it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._handlers = {}
+
+    def init_app(self, app, db):
+        """Count the SQL statements and commits of the app's database"""
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", self._on_statement)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_statement(self, *args):
+        self.record("sql_statements")
+
+    def _on_commit(self, *args):
+        self.record("commits")
+
+    def record(self, counter, amount=1):
+        """Add to a counter of the handler running in this thread, if any"""
+        current = getattr(self._local, "current", None)
+        if current is not None:
+            current[counter] += amount
+
+    def instrument(self, handler):
+        """Decorator recording the latency and the work done by a handler"""
+        name = handler.__name__
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            previous = getattr(self._local, "current", None)
+            current = {counter: 0 for counter, _ in COUNTERS}
+            self._local.current = current
+            failed = False
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self._local.current = previous
+                self._observe(name, elapsed, current, failed)
+
+        return wrapper
+
+    def _observe(self, name, elapsed, counters, failed):
+        with self._lock:
+            stats = self._handlers.get(name)
+            if stats is None:
+                stats = {
+                    "count": 0,
+                    "errors": 0,
+                    "seconds": 0.0,
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                }
+                stats.update({counter: 0 for counter, _ in COUNTERS})
+                self._handlers[name] = stats
+
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["seconds"] += elapsed
+            for idx, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    stats["buckets"][idx] += 1
+            for counter, amount in counters.items():
+                stats[counter] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: dict(stats, buckets=list(stats["buckets"]))
+                for name, stats in self._handlers.items()
+            }
+
+    def render_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        handlers = sorted(self.snapshot().items())
+        lines = [
+            "# HELP clueless_handler_duration_seconds Wall time of the Socket.IO handlers",
+            "# TYPE clueless_handler_duration_seconds histogram",
+        ]
+        for name, stats in handlers:
+            for bound, observed in zip(LATENCY_BUCKETS, stats["buckets"]):
+                lines.append(f'clueless_handler_duration_seconds_bucket{{handler="{name}",le="{bound}"}} {observed}')
+            lines.append(f'clueless_handler_duration_seconds_bucket{{handler="{name}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'clueless_handler_duration_seconds_sum{{handler="{name}"}} {stats["seconds"]}')
+            lines.append(f'clueless_handler_duration_seconds_count{{handler="{name}"}} {stats["count"]}')
+
+        lines.append("# HELP clueless_handler_errors_total Handler calls that raised an exception")
+        lines.append("# TYPE clueless_handler_errors_total counter")
+        for name, stats in handlers:
+            lines.append(f'clueless_handler_errors_total{{handler="{name}"}} {stats["errors"]}')
+
+        for counter, description in COUNTERS:
+            lines.append(f"# HELP clueless_handler_{counter}_total {description}")
+            lines.append(f"# TYPE clueless_handler_{counter}_total counter")
+            for name, stats in handlers:
+                lines.append(f'clueless_handler_{counter}_total{{handler="{name}"}} {stats[counter]}')
+
+        return "\n".join(lines) + "\n"
+
+
+class CountingJSON:
+    """Drop-in for the json module that reports its work to the handler metrics.
+
+    The models use it for their JSON columns. The Socket.IO server uses an
+    instance with count_bytes=True to encode packets, which gives the size of
+    the payloads emitted.
+    """
+
+    def __init__(self, metrics, count_bytes=False):
+        self.metrics = metrics
+        self.count_bytes = count_bytes
+
+    def dumps(self, obj, *args, **kwargs):
+        encoded = json.dumps(obj, *args, **kwargs)
+        if self.count_bytes:
+            self.metrics.record("payload_bytes", len(encoded))
+        else:
+            self.metrics.record("json_encodes")
+        return encoded
+
+    def loads(self, s, *args, **kwargs):
+        if not self.count_bytes:
+            self.metrics.record("json_decodes")
+        return json.loads(s, *args, **kwargs)
+
+
+handler_metrics = HandlerMetrics()
+instrumented = handler_metrics.instrument
+model_json = CountingJSON(handler_metrics)
+packet_json = CountingJSON(handler_metrics, count_bytes=True)
@@ -0,0 +1,8 @@
+from .runner import (
+    Revision, load_revisions, current_version, applied_revisions, pending_revisions, upgrade, require_current,
+)
+
+
+__all__ = ['Revision', 'load_revisions', 'current_version', 'applied_revisions', 'pending_revisions', 'upgrade',
+           'require_current']
+# Versioned schema migrations, applied with `python -m migrations upgrade`.
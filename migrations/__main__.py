@@ -0,0 +1,65 @@
+"""Apply or inspect the schema migrations of the game database.
+
+    python -m migrations status
+    python -m migrations upgrade
+    python -m migrations upgrade --to 5 --database-url postgresql://...
+    python -m migrations history
+
+The database is DATABASE_URL (or --database-url), with the same default
+and the same instance folder as the server.
+"""
+import argparse
+import datetime
+import os
+
+from flask import Flask
+
+from extensions import DEFAULT_DATABASE_URL, db, init_db
+from logs import init_logging
+from . import runner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_app(database_url):
+    """A bare app resolving the database URL like the server's"""
+    app = Flask("main", root_path=ROOT)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+    init_logging(app)
+    init_db(app)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Manage the database schema")
+    parser.add_argument("command", choices=("status", "upgrade", "history"))
+    parser.add_argument("--to", type=int, default=None, help="last revision to apply (default: all)")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL))
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        engine = db.engine
+        if args.command == "upgrade":
+            applied = runner.upgrade(engine, target=args.to)
+            for revision in applied:
+                print(f"applied {revision.name}: {revision.description}")
+            if not applied:
+                print("nothing to apply")
+
+        with engine.connect() as connection:
+            current = runner.current_version(connection)
+            if args.command == "history":
+                for version, name, applied_at in runner.applied_revisions(connection):
+                    when = datetime.datetime.fromtimestamp(applied_at).isoformat(sep=" ", timespec="seconds")
+                    print(f"{name:<36} applied {when}")
+            pending = runner.pending_revisions(connection)
+
+    print(f"schema at revision {current}, {len(pending)} pending")
+    for revision in pending:
+        print(f"  {revision.name}: {revision.description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Schema changes for the revisions, each skipped if already made"""
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateColumn
+
+
+def has_table(connection, table):
+    return sa.inspect(connection).has_table(table)
+
+
+def has_column(connection, table, column):
+    return any(info["name"] == column for info in sa.inspect(connection).get_columns(table))
+
+
+def has_index(connection, table, index):
+    return any(info["name"] == index for info in sa.inspect(connection).get_indexes(table))
+
+
+def _quote(connection, name):
+    return connection.dialect.identifier_preparer.quote(name)
+
+
+def create_table(connection, table):
+    """Create an sa.Table unless it exists"""
+    table.create(connection, checkfirst=True)
+
+
+def add_column(connection, table, column):
+    """Add an sa.Column to a table. A NOT NULL column needs a server_default."""
+    if has_column(connection, table, column.name):
+        return False
+    spec = CreateColumn(column).compile(dialect=connection.dialect)
+    connection.execute(sa.text(f"ALTER TABLE {_quote(connection, table)} ADD COLUMN {spec}"))
+    return True
+
+
+def drop_column(connection, table, column):
+    if not has_column(connection, table, column):
+        return False
+    connection.execute(sa.text(f"ALTER TABLE {_quote(connection, table)} DROP COLUMN {_quote(connection, column)}"))
+    return True
+
+
+def alter_column_type(connection, table, column, type_):
+    """Change the type of a column. SQLite columns take any value, so it is left as is."""
+    dialect = connection.dialect
+    if dialect.name == "sqlite":
+        return False
+    compiled = type_.compile(dialect=dialect)
+    if dialect.name in ("mysql", "mariadb"):
+        statement = f"ALTER TABLE {_quote(connection, table)} MODIFY {_quote(connection, column)} {compiled}"
+    else:
+        statement = f"ALTER TABLE {_quote(connection, table)} ALTER COLUMN {_quote(connection, column)} TYPE {compiled}"
+    connection.execute(sa.text(statement))
+    return True
+
+
+def create_index(connection, name, table, *columns):
+    if has_index(connection, table, name):
+        return False
+    column_list = ", ".join(_quote(connection, column) for column in columns)
+    connection.execute(sa.text(f"CREATE INDEX {_quote(connection, name)} ON {_quote(connection, table)} ({column_list})"))
+    return True
@@ -0,0 +1,120 @@
+"""Versioned schema migrations.
+
+The schema is changed by the revision files of migrations/versions, named
+NNNN_description.py, each with an upgrade(connection) function. They are
+applied once, in order, each in its own transaction, and recorded in the
+schema_version table. The server does no DDL: at startup it only checks
+that the database has every revision (require_current). They are applied
+with `python -m migrations upgrade`.
+
+Databases created before the migrations existed got their tables from
+db.create_all, at whatever point of the history they were made, so every
+revision checks what is already there before changing it (see
+migrations.ops). Running a revision again is harmless too.
+"""
+import importlib
+import pkgutil
+import re
+import time
+
+import sqlalchemy as sa
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+REVISION_NAME = re.compile(r"^(\d{4})_\w+$")
+
+schema_version = sa.Table(
+    "schema_version",
+    sa.MetaData(),
+    sa.Column("version", sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column("name", sa.String(100), nullable=False),
+    sa.Column("applied_at", sa.Float, nullable=False),
+)
+
+
+class Revision:
+    """One revision file"""
+
+    __slots__ = ("version", "name", "description", "upgrade")
+
+    def __init__(self, version, name, description, upgrade):
+        self.version = version
+        self.name = name
+        self.description = description
+        self.upgrade = upgrade
+
+    def __repr__(self):
+        return f"Revision({self.name!r})"
+
+
+def load_revisions():
+    """The revisions of migrations/versions, oldest first"""
+    from . import versions
+
+    revisions = []
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        match = REVISION_NAME.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{versions.__name__}.{module_info.name}")
+        description = (module.__doc__ or module_info.name).strip().splitlines()[0]
+        revisions.append(Revision(int(match.group(1)), module_info.name, description, module.upgrade))
+
+    revisions.sort(key=lambda revision: revision.version)
+    for previous, revision in zip(revisions, revisions[1:]):
+        if previous.version == revision.version:
+            raise ValueError(f"Revisions {previous.name} and {revision.name} have the same number")
+    return revisions
+
+
+def current_version(connection):
+    """The last revision applied to the database, 0 if none"""
+    if not sa.inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.execute(sa.select(sa.func.max(schema_version.c.version))).scalar() or 0
+
+
+def applied_revisions(connection):
+    """(version, name, applied_at) of the revisions applied, oldest first"""
+    if not sa.inspect(connection).has_table(schema_version.name):
+        return []
+    query = sa.select(schema_version.c.version, schema_version.c.name, schema_version.c.applied_at)
+    return connection.execute(query.order_by(schema_version.c.version)).all()
+
+
+def pending_revisions(connection):
+    """The revisions the database does not have yet"""
+    current = current_version(connection)
+    return [revision for revision in load_revisions() if revision.version > current]
+
+
+def upgrade(engine, target=None):
+    """Apply the pending revisions, up to target if given. Returns those applied."""
+    with engine.begin() as connection:
+        schema_version.create(connection, checkfirst=True)
+        pending = pending_revisions(connection)
+
+    applied = []
+    for revision in pending:
+        if target is not None and revision.version > target:
+            break
+        with engine.begin() as connection:
+            revision.upgrade(connection)
+            connection.execute(schema_version.insert().values(
+                version=revision.version, name=revision.name, applied_at=time.time()))
+        logger.info("Applied schema revision", extra={"revision": revision.name})
+        applied.append(revision)
+    return applied
+
+
+def require_current(engine):
+    """Raise RuntimeError unless every revision has been applied"""
+    with engine.connect() as connection:
+        pending = pending_revisions(connection)
+    if pending:
+        raise RuntimeError(
+            f"The database is missing {len(pending)} schema revision(s), from {pending[0].name}. "
+            "Apply them with `python -m migrations upgrade`."
+        )
@@ -0,0 +1,43 @@
+"""Lobby, player and board tables, as first released"""
+import sqlalchemy as sa
+
+from .. import ops
+
+metadata = sa.MetaData()
+
+lobby = sa.Table(
+    "lobby", metadata,
+    sa.Column("id", sa.String(6), primary_key=True),
+    sa.Column("status", sa.String(10)),
+    sa.Column("host", sa.String(36), nullable=False),
+    sa.Column("current_turn_idx", sa.Integer),
+    # Lobby and board reference each other, so this one is added afterwards
+    sa.Column("board_id", sa.String(36), sa.ForeignKey("board.id", name="fk_lobby_board_id", use_alter=True)),
+    sa.Column("solution", sa.Text),
+    sa.Column("characters", sa.Text, nullable=False),
+    sa.Column("suggestions", sa.Text),
+)
+
+player = sa.Table(
+    "player", metadata,
+    sa.Column("id", sa.String(36), primary_key=True),
+    sa.Column("lobby_id", sa.String(36), sa.ForeignKey("lobby.id")),
+    sa.Column("name", sa.String(50), nullable=False),
+    sa.Column("character", sa.String(50)),
+    sa.Column("cards", sa.Text, nullable=False),
+    sa.Column("eliminated", sa.Boolean),
+)
+
+board = sa.Table(
+    "board", metadata,
+    sa.Column("id", sa.String(36), primary_key=True),
+    sa.Column("lobby_id", sa.String(36), sa.ForeignKey("lobby.id"), nullable=False),
+    sa.Column("hallways", sa.Text, nullable=False),
+    sa.Column("rooms", sa.Text, nullable=False),
+    sa.Column("secret_passages", sa.Text, nullable=False),
+)
+
+
+def upgrade(connection):
+    if not any(ops.has_table(connection, table.name) for table in metadata.sorted_tables):
+        metadata.create_all(connection)
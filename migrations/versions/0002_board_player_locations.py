@@ -0,0 +1,30 @@
+"""Board.player_locations, the reverse index of the occupancy maps"""
+import json
+
+import sqlalchemy as sa
+
+from .. import ops
+
+board = sa.table("board", sa.column("id"), sa.column("rooms"), sa.column("hallways"), sa.column("player_locations"))
+
+
+def player_locations(rooms, hallways):
+    locations = {}
+    for room, occupants in (rooms or {}).items():
+        for player_id in occupants or []:
+            locations[player_id] = {"type": "room", "location": room}
+    for hallway, player_id in (hallways or {}).items():
+        if player_id:
+            locations[player_id] = {"type": "hallway", "location": hallway}
+    return locations
+
+
+def upgrade(connection):
+    if not ops.add_column(connection, "board", sa.Column("player_locations", sa.Text, nullable=False,
+                                                          server_default=sa.text("'{}'"))):
+        return
+    rows = connection.execute(sa.select(board.c.id, board.c.rooms, board.c.hallways)).all()
+    for row in rows:
+        locations = player_locations(json.loads(row.rooms or "{}"), json.loads(row.hallways or "{}"))
+        if locations:
+            connection.execute(board.update().where(board.c.id == row.id).values(player_locations=json.dumps(locations)))
@@ -0,0 +1,9 @@
+"""Lobby.turn_order, the player ids in turn order"""
+import sqlalchemy as sa
+
+from .. import ops
+
+
+def upgrade(connection):
+    # Left empty for existing games, which then play in player order
+    ops.add_column(connection, "lobby", sa.Column("turn_order", sa.Text))
@@ -0,0 +1,8 @@
+"""Player.character holds the character's JSON document, longer than 50 characters"""
+import sqlalchemy as sa
+
+from .. import ops
+
+
+def upgrade(connection):
+    ops.alter_column_type(connection, "player", "character", sa.Text())
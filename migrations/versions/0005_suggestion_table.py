@@ -0,0 +1,61 @@
+"""Suggestion table, replacing the JSON history on the lobby row"""
+import json
+
+import sqlalchemy as sa
+
+from .. import ops
+
+metadata = sa.MetaData()
+
+# Only what this revision reads and writes; the table is not created here
+lobby = sa.Table(
+    "lobby", metadata,
+    sa.Column("id", sa.String(6), primary_key=True),
+    sa.Column("suggestions", sa.Text),
+    sa.Column("suggestion_count", sa.Integer),
+)
+
+suggestion = sa.Table(
+    "suggestion", metadata,
+    sa.Column("lobby_id", sa.String(6), sa.ForeignKey("lobby.id"), primary_key=True),
+    sa.Column("idx", sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column("player_id", sa.String(36), nullable=False),
+    sa.Column("suspect", sa.String(50), nullable=False),
+    sa.Column("weapon", sa.String(50), nullable=False),
+    sa.Column("room", sa.String(50), nullable=False),
+    sa.Column("disproved_by", sa.String(36)),
+    sa.Column("card_shown", sa.Boolean),
+    sa.Column("timestamp", sa.String(32)),
+)
+
+
+def upgrade(connection):
+    ops.create_table(connection, suggestion)
+    ops.add_column(connection, "lobby", sa.Column("suggestion_count", sa.Integer, nullable=False,
+                                                  server_default=sa.text("0")))
+    if not ops.has_column(connection, "lobby", "suggestions"):
+        return
+
+    rows = connection.execute(sa.select(lobby.c.id, lobby.c.suggestions).where(lobby.c.suggestions.isnot(None))).all()
+    for row in rows:
+        try:
+            history = json.loads(row.suggestions)
+        except ValueError:
+            history = []
+        if not isinstance(history, list):
+            history = []
+        for idx, entry in enumerate(history):
+            connection.execute(suggestion.insert().values(
+                lobby_id=row.id,
+                idx=idx,
+                player_id=entry["player_id"],
+                suspect=entry["suspect"],
+                weapon=entry["weapon"],
+                room=entry["room"],
+                disproved_by=entry.get("disproved_by"),
+                # Only whether a card was shown is kept, never the card
+                card_shown=None if entry.get("card_shown") is None else bool(entry["card_shown"]),
+                timestamp=entry.get("timestamp"),
+            ))
+        connection.execute(lobby.update().where(lobby.c.id == row.id).values(suggestion_count=len(history)))
+    ops.drop_column(connection, "lobby", "suggestions")
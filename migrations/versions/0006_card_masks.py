@@ -0,0 +1,35 @@
+"""Player.hand and Suggestion.mask, cards as bitmasks, replacing Player.cards"""
+import json
+
+import sqlalchemy as sa
+
+from engine import cards_to_mask, suggestion_mask
+from .. import ops
+
+player = sa.table("player", sa.column("id"), sa.column("cards"), sa.column("hand"))
+suggestion = sa.table("suggestion", sa.column("lobby_id"), sa.column("idx"), sa.column("suspect"),
+                      sa.column("weapon"), sa.column("room"), sa.column("mask"))
+
+
+def upgrade(connection):
+    ops.add_column(connection, "player", sa.Column("hand", sa.Integer, nullable=False, server_default=sa.text("0")))
+    if ops.has_column(connection, "player", "cards"):
+        for row in connection.execute(sa.select(player.c.id, player.c.cards)).all():
+            try:
+                names = json.loads(row.cards or "[]")
+            except ValueError:
+                names = []
+            if names:
+                connection.execute(player.update().where(player.c.id == row.id).values(hand=cards_to_mask(names)))
+        ops.drop_column(connection, "player", "cards")
+
+    if ops.add_column(connection, "suggestion", sa.Column("mask", sa.Integer, nullable=False,
+                                                          server_default=sa.text("0"))):
+        query = sa.select(suggestion.c.lobby_id, suggestion.c.idx, suggestion.c.suspect,
+                          suggestion.c.weapon, suggestion.c.room)
+        for row in connection.execute(query).all():
+            connection.execute(
+                suggestion.update()
+                .where(suggestion.c.lobby_id == row.lobby_id, suggestion.c.idx == row.idx)
+                .values(mask=suggestion_mask(row.suspect, row.weapon, row.room))
+            )
@@ -0,0 +1,9 @@
+"""Lobby.auto_disprove, the opt-in automatic disproval"""
+import sqlalchemy as sa
+
+from .. import ops
+
+
+def upgrade(connection):
+    ops.add_column(connection, "lobby", sa.Column("auto_disprove", sa.Boolean, nullable=False,
+                                                  server_default=sa.false()))
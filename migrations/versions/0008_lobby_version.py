@@ -0,0 +1,8 @@
+"""Lobby.version, the version of the last game snapshot written"""
+import sqlalchemy as sa
+
+from .. import ops
+
+
+def upgrade(connection):
+    ops.add_column(connection, "lobby", sa.Column("version", sa.Integer, nullable=False, server_default=sa.text("0")))
@@ -0,0 +1,15 @@
+"""lobby_id_block, the counter the lobby ids are allocated from"""
+import sqlalchemy as sa
+
+from .. import ops
+
+lobby_id_block = sa.Table(
+    "lobby_id_block", sa.MetaData(),
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("secret", sa.BigInteger, nullable=False),
+    sa.Column("next_counter", sa.BigInteger, nullable=False),
+)
+
+
+def upgrade(connection):
+    ops.create_table(connection, lobby_id_block)
@@ -0,0 +1,15 @@
+"""Lobby.last_active, and its index, for the archival of idle lobbies"""
+import time
+
+import sqlalchemy as sa
+
+from .. import ops
+
+lobby = sa.table("lobby", sa.column("last_active"))
+
+
+def upgrade(connection):
+    if ops.add_column(connection, "lobby", sa.Column("last_active", sa.Float)):
+        # Count existing lobbies as active now, rather than all idle at once
+        connection.execute(lobby.update().values(last_active=time.time()))
+    ops.create_index(connection, "ix_lobby_last_active", "lobby", "last_active")
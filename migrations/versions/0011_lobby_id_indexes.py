@@ -0,0 +1,7 @@
+"""Indexes on Player.lobby_id and Board.lobby_id"""
+from .. import ops
+
+
+def upgrade(connection):
+    ops.create_index(connection, "ix_player_lobby_id", "player", "lobby_id")
+    ops.create_index(connection, "ix_board_lobby_id", "board", "lobby_id")
@@ -0,0 +1,10 @@
+"""Suggestion.next_disprover, the player asked to disprove a suggestion"""
+import sqlalchemy as sa
+
+from .. import ops
+
+
+def upgrade(connection):
+    # Suggestions made before are left closed: a round in progress is ended
+    # by its player going on to the next turn
+    ops.add_column(connection, "suggestion", sa.Column("next_disprover", sa.String(36)))
@@ -0,0 +1,6 @@
+"""Index on Lobby.status, for loading the waiting lobbies at startup"""
+from .. import ops
+
+
+def upgrade(connection):
+    ops.create_index(connection, "ix_lobby_status", "lobby", "status")
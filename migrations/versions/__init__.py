@@ -0,0 +1 @@
+# Revision files, NNNN_description.py, applied in order by migrations.upgrade.
@@ -1,8 +1,11 @@
 from .lobby import Lobby
+from .lobby_id import LobbyIdBlock, lobby_ids
 from .player import Player
 from .board import Board
-from .card import Cards
+from .suggestion import Suggestion
+from .repository import load_lobby_for_event
+from .game_state import GameState, GameStateStore, game_states
 
 
-__all__ = ['Lobby', 'Player', 'Board', 'Cards']
+__all__ = ['Lobby', 'Player', 'Board', 'Suggestion', 'load_lobby_for_event', 'GameState', 'GameStateStore', 'game_states', 'LobbyIdBlock', 'lobby_ids']
 # This file is used to import all models in the models package.
\ No newline at end of file
@@ -0,0 +1,186 @@
+from extensions import db, socketio
+import threading
+
+from engine import Game
+from .repository import load_lobby_for_event
+from .types import to_plain
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+
+class GameState(Game):
+    """Live state of a started game, held in memory while the game is running.
+
+    This is the source of truth for every in-game event. The rules are those
+    of engine.Game; the database rows of the lobby, its board and its players
+    are only written from snapshots, see GameStateStore.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_lobby(cls, lobby):
+        """Build the live state from the persisted lobby, board and players"""
+        board = lobby.get_board()
+
+        return cls(
+            lobby_id=lobby.id,
+            host=lobby.host,
+            status=lobby.status,
+            current_turn_idx=lobby.current_turn_idx or 0,
+            players=[player._get_player_state() for player in lobby.get_ordered_players()],
+            solution=to_plain(lobby.solution) if lobby.solution else {},
+            suggestions=[suggestion.to_dict() for suggestion in lobby.suggestions],
+            rooms=to_plain(board.rooms) if board else {},
+            hallways=to_plain(board.hallways) if board else {},
+            player_locations=to_plain(board.player_locations) if board else {},
+            auto_disprove=bool(lobby.auto_disprove),
+            version=lobby.version or 0,
+        )
+
+
+class GameStateStore:
+    """Registry of the live games of this process, with write-behind persistence.
+
+    Handlers mutate a GameState and then call mark_dirty, which only takes a
+    snapshot. A background task writes the pending snapshots to the database
+    in one transaction every GAME_STATE_FLUSH_INTERVAL seconds, and a game is
+    flushed immediately when it ends.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.flush_interval = 2.0
+        self._states = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        # One flush at a time, so two writes of a lobby never race on its
+        # version (the flusher and end_game)
+        self._flush_lock = threading.Lock()
+        self._flusher_started = False
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config.get("GAME_STATE_FLUSH_INTERVAL", 2.0)
+
+    def start_flusher(self):
+        """Start the background task writing dirty games to the database"""
+        with self._lock:
+            if self._flusher_started:
+                return
+            self._flusher_started = True
+        socketio.start_background_task(self._flush_loop)
+
+    def _flush_loop(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing game state")
+
+    def get(self, lobby_id):
+        """Get the live game of a lobby, loading it from the database if needed"""
+        with self._lock:
+            state = self._states.get(lobby_id)
+        if state is not None:
+            return state
+
+        # Not in memory (e.g. after a restart): rebuild it from the last snapshot
+        lobby = load_lobby_for_event(lobby_id)
+        if lobby is None or lobby.status != "in_progress":
+            return None
+
+        state = GameState.from_lobby(lobby)
+        with self._lock:
+            return self._states.setdefault(lobby_id, state)
+
+    def has(self, lobby_id):
+        """Whether a lobby's game is live in this process"""
+        with self._lock:
+            return lobby_id in self._states
+
+    def register(self, lobby):
+        """Start tracking a lobby whose game has just been initialized"""
+        state = GameState.from_lobby(lobby)
+        with self._lock:
+            self._states[lobby.id] = state
+        return state
+
+    def mark_dirty(self, state):
+        """Queue the current state of a game to be written to the database"""
+        snapshot = state.snapshot()
+        with self._lock:
+            self._queue(snapshot)
+
+    def _queue(self, snapshot, newer=True):
+        """Queue a snapshot, keeping the suggestions of the one it replaces.
+
+        Called with the lock held. With newer=False (a snapshot that failed to
+        be written) a snapshot queued meanwhile takes precedence.
+        """
+        queued = self._pending.get(snapshot["lobby_id"])
+        if queued is None:
+            self._pending[snapshot["lobby_id"]] = snapshot
+        elif newer:
+            snapshot["suggestions"] = {**queued["suggestions"], **snapshot["suggestions"]}
+            self._pending[snapshot["lobby_id"]] = snapshot
+        else:
+            queued["suggestions"] = {**snapshot["suggestions"], **queued["suggestions"]}
+
+    def end_game(self, state, status="finished"):
+        """Persist a finished game right away and stop tracking it"""
+        state.status = status
+        self.mark_dirty(state)
+        self.flush([state.lobby_id])
+        with self._lock:
+            self._states.pop(state.lobby_id, None)
+
+    def flush(self, lobby_ids=None):
+        """Write pending snapshots to the database in a single transaction"""
+        with self._flush_lock:
+            return self._flush(lobby_ids)
+
+    def _flush(self, lobby_ids):
+        with self._lock:
+            if lobby_ids is None:
+                pending, self._pending = self._pending, {}
+            else:
+                pending = {
+                    lobby_id: self._pending.pop(lobby_id)
+                    for lobby_id in lobby_ids
+                    if lobby_id in self._pending
+                }
+        if not pending:
+            return 0
+
+        # A fresh app context gets its own session, independent of any handler
+        with self.app.app_context():
+            try:
+                for snapshot in pending.values():
+                    self._write_snapshot(snapshot)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Put the snapshots back behind any newer one queued meanwhile
+                with self._lock:
+                    for snapshot in pending.values():
+                        self._queue(snapshot, newer=False)
+                raise
+
+        return len(pending)
+
+    def _write_snapshot(self, snapshot):
+        lobby = load_lobby_for_event(snapshot["lobby_id"])
+        if lobby is None:
+            return
+        if snapshot["version"] <= (lobby.version or 0):
+            # Already superseded, e.g. written by the lobby's previous owner
+            logger.warning("Skipping stale snapshot", extra={
+                "lobby_id": lobby.id, "version": snapshot["version"], "stored_version": lobby.version})
+            return
+        lobby.apply_snapshot(snapshot)
+
+
+game_states = GameStateStore()
@@ -0,0 +1,184 @@
+from extensions import db, socketio
+import collections
+import hashlib
+import random
+import string
+import threading
+import time
+
+from sqlalchemy import column, select, table, update
+from sqlalchemy.exc import IntegrityError
+
+from logs import get_logger
+
+logger = get_logger(__name__)
+
+ALPHABET = string.ascii_uppercase + string.digits
+ID_LENGTH = 6
+ID_SPACE = len(ALPHABET) ** ID_LENGTH
+
+# The Feistel network permutes 32 bit numbers, the smallest even width
+# covering ID_SPACE (36**6 is just above 2**31)
+HALF_BITS = 16
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+# Ids checked against the lobby table per query when a block is reserved
+EXISTING_CHECK_CHUNK = 500
+
+lobby = table("lobby", column("id"))
+
+
+class LobbyIdBlock(db.Model):
+    """Counter of the lobby ids handed out, shared by every worker.
+
+    A single row: each worker takes the next block of counter values with
+    one UPDATE and maps them to ids through a permutation keyed by secret.
+    """
+
+    __tablename__ = "lobby_id_block"
+
+    id = db.Column(db.Integer, primary_key=True)
+    secret = db.Column(db.BigInteger, nullable=False)
+    next_counter = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+def permute(counter, secret):
+    """Map a counter below ID_SPACE to a unique number below ID_SPACE.
+
+    A keyed Feistel network is a permutation of the 32 bit numbers; applying
+    it again until the result falls below ID_SPACE (cycle walking) keeps it
+    a permutation of the smaller range. Consecutive counters give unrelated
+    ids, so codes cannot be guessed from one another.
+    """
+    key = secret.to_bytes(8, "big")
+    value = counter
+    while True:
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for round_ in range(ROUNDS):
+            digest = hashlib.blake2b(bytes((round_,)) + right.to_bytes(2, "big"), digest_size=2, key=key).digest()
+            left, right = right, left ^ int.from_bytes(digest, "big")
+        value = (left << HALF_BITS) | right
+        if value < ID_SPACE:
+            return value
+
+
+def encode(number):
+    """The ID_LENGTH character code of a number below ID_SPACE"""
+    chars = []
+    for _ in range(ID_LENGTH):
+        number, digit = divmod(number, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+class LobbyIdAllocator:
+    """Hands out unique lobby ids without going to the database.
+
+    Ids come from blocks of LOBBY_ID_BLOCK_SIZE counter values reserved in
+    lobby_id_block; the next block is reserved in the background once the
+    current one runs low. Ids of deleted lobbies are given back with
+    release() and reused after LOBBY_ID_COOLDOWN seconds, so a player still
+    holding an old code does not land in somebody else's lobby. Released ids
+    are only kept in memory: those not reused before a restart are never
+    handed out again.
+
+    Lobbies created before the allocator have random codes, which a block
+    may contain; refill() leaves out the ids already in the lobby table.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.block_size = 1000
+        self.cooldown = 3600.0
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._refilling = False
+        self._fresh = collections.deque()
+        # (reusable from, lobby id), oldest first
+        self._released = collections.deque()
+
+    def init_app(self, app):
+        self.app = app
+        self.block_size = app.config.get("LOBBY_ID_BLOCK_SIZE", 1000)
+        self.cooldown = app.config.get("LOBBY_ID_COOLDOWN", 3600.0)
+
+    def allocate(self):
+        """A lobby id no other lobby has"""
+        while True:
+            with self._lock:
+                if self._released and self._released[0][0] <= time.monotonic():
+                    return self._released.popleft()[1]
+                lobby_id = self._fresh.popleft() if self._fresh else None
+                refill = lobby_id is not None and len(self._fresh) < self.block_size // 4 and not self._refilling
+                if refill:
+                    self._refilling = True
+            if lobby_id is None:
+                # Only before the first block, or if the background refill fell behind
+                self.refill()
+                continue
+            if refill:
+                socketio.start_background_task(self._refill_in_background)
+            return lobby_id
+
+    def release(self, lobby_id):
+        """Give back the id of a lobby whose row has been deleted"""
+        with self._lock:
+            self._released.append((time.monotonic() + self.cooldown, lobby_id))
+
+    def refill(self):
+        """Reserve the next block of ids"""
+        with self._refill_lock:
+            secret, start = self._reserve(self.block_size)
+            end = min(start + self.block_size, ID_SPACE)
+            if start >= end:
+                raise RuntimeError("Every lobby id has been handed out")
+            ids = self._unused([encode(permute(counter, secret)) for counter in range(start, end)])
+            with self._lock:
+                self._fresh.extend(ids)
+        logger.debug("Reserved lobby ids", extra={"start": start, "count": len(ids)})
+
+    def _refill_in_background(self):
+        try:
+            with self.app.app_context():
+                self.refill()
+        except Exception:
+            logger.exception("Error reserving lobby ids")
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    @staticmethod
+    def _unused(ids):
+        """The ids no lobby has yet"""
+        taken = set()
+        with db.engine.connect() as connection:
+            for i in range(0, len(ids), EXISTING_CHECK_CHUNK):
+                chunk = ids[i:i + EXISTING_CHECK_CHUNK]
+                taken.update(connection.execute(select(lobby.c.id).where(lobby.c.id.in_(chunk))).scalars())
+        if taken:
+            logger.info("Skipped lobby ids already in use", extra={"count": len(taken)})
+        return [lobby_id for lobby_id in ids if lobby_id not in taken]
+
+    def _reserve(self, count):
+        """Take count counter values, returning the secret and the first one"""
+        table = LobbyIdBlock.__table__
+        # Its own transaction, so the caller's session is left alone
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(table).where(table.c.id == 1).values(next_counter=table.c.next_counter + count)
+            )
+            row = connection.execute(select(table.c.secret, table.c.next_counter).where(table.c.id == 1)).one_or_none()
+        if row is not None:
+            return row.secret, row.next_counter - count
+
+        # First use of the database; another worker may be creating it too
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.insert().values(id=1, secret=random.SystemRandom().getrandbits(62), next_counter=0))
+        except IntegrityError:
+            pass
+        return self._reserve(count)
+
+
+lobby_ids = LobbyIdAllocator()
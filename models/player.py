@@ -1,24 +1,20 @@
 import uuid
 from extensions import db
-import random
-import string
-import json
+
+from engine import mask_to_cards
+from .types import JSONDict, to_plain
 
 
 def generate_uuid():
     return str(uuid.uuid4())
 
 
-def generate_lobby_id():
-    return "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
-
-
 class Player(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
-    lobby_id = db.Column(db.String(36), db.ForeignKey("lobby.id"), nullable=True)
+    lobby_id = db.Column(db.String(36), db.ForeignKey("lobby.id"), nullable=True, index=True)
     name = db.Column(db.String(50), nullable=False)
-    character = db.Column(db.String(50), nullable=True)
-    cards = db.Column(db.Text, nullable=False, default=json.dumps([]))  # Player's cards
+    character = db.Column(JSONDict, nullable=True)
+    hand = db.Column(db.Integer, nullable=False, default=0)  # Player's cards, as a Card mask
     eliminated = db.Column(
         db.Boolean, default=False
     )  # If player made incorrect accusation
@@ -30,17 +26,22 @@ class Player(db.Model):
         self.lobby_id = lobby_id
         self.character = None
         self.eliminated = False
-        self.cards = json.dumps([])
+        self.hand = 0
 
     def __repr__(self):
         return f"Player('{self.id}', '{self.name}')"
 
+    @property
+    def cards(self):
+        """Names of the player's cards"""
+        return mask_to_cards(self.hand or 0)
+
     def _get_player_state(self):
         return {
             "id": self.id,
             "name": self.name,
-            "character": json.loads(self.character) if self.character else None,
-            "cards": json.loads(self.cards),
+            "character": to_plain(self.character) if self.character else None,
+            "hand": self.hand or 0,
             "eliminated": self.eliminated,
         }
     
\ No newline at end of file
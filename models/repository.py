@@ -0,0 +1,19 @@
+from extensions import db
+
+from .lobby import Lobby
+
+
+def load_lobby_for_event(lobby_id):
+    """Load a lobby together with its players and its board.
+
+    The board is joined into the lobby query and the players are fetched by a
+    single SELECT ... IN, so handling an event costs two queries however many
+    players the lobby has. The model methods then work on these loaded objects
+    (see Lobby.get_player and Lobby.get_board) instead of querying again.
+    """
+    return (
+        Lobby.query
+        .options(db.joinedload(Lobby.board), db.selectinload(Lobby.players))
+        .filter_by(id=lobby_id)
+        .first()
+    )
@@ -0,0 +1,60 @@
+from extensions import db
+from engine import suggestion_mask
+
+
+class Suggestion(db.Model):
+    """One suggestion of a lobby's history, stored as its own row.
+
+    Rows are keyed by (lobby_id, idx), idx being the position in the history,
+    so appending a suggestion is one INSERT and looking one up is a primary
+    key lookup, however long the game has been running.
+    """
+
+    lobby_id = db.Column(db.String(6), db.ForeignKey("lobby.id"), primary_key=True)
+    idx = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    player_id = db.Column(db.String(36), nullable=False)
+    suspect = db.Column(db.String(50), nullable=False)
+    weapon = db.Column(db.String(50), nullable=False)
+    room = db.Column(db.String(50), nullable=False)
+    # The three cards as a Card mask, so disproving is `hand & mask`
+    mask = db.Column(db.Integer, nullable=False, default=0)
+    disproved_by = db.Column(db.String(36), nullable=True)
+    # Only whether a card was shown; the card itself is never stored
+    card_shown = db.Column(db.Boolean, nullable=True)
+    timestamp = db.Column(db.String(32), nullable=True)
+    # The player asked to disprove it, None once it is disproved or closed
+    next_disprover = db.Column(db.String(36), nullable=True)
+
+    def __init__(self, lobby_id, idx, suggestion):
+        self.lobby_id = lobby_id
+        self.idx = idx
+        self.update(suggestion)
+
+    def __repr__(self):
+        return f"Suggestion('{self.lobby_id}', {self.idx})"
+
+    def update(self, suggestion):
+        """Copy the fields of a suggestion dict onto the row"""
+        self.player_id = suggestion["player_id"]
+        self.suspect = suggestion["suspect"]
+        self.weapon = suggestion["weapon"]
+        self.room = suggestion["room"]
+        self.mask = suggestion.get("mask") or suggestion_mask(self.suspect, self.weapon, self.room)
+        self.disproved_by = suggestion.get("disproved_by")
+        self.card_shown = suggestion.get("card_shown")
+        self.timestamp = suggestion.get("timestamp")
+        self.next_disprover = suggestion.get("next_disprover")
+
+    def to_dict(self):
+        return {
+            "player_id": self.player_id,
+            "suspect": self.suspect,
+            "weapon": self.weapon,
+            "room": self.room,
+            "mask": self.mask,
+            "disproved_by": self.disproved_by,
+            "card_shown": self.card_shown,
+            "timestamp": self.timestamp,
+            "next_disprover": self.next_disprover,
+        }
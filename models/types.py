@@ -0,0 +1,180 @@
+from extensions import db
+from metrics import model_json as json
+from sqlalchemy.ext.mutable import Mutable
+
+
+class JSONEncoded(db.TypeDecorator):
+    """A JSON document stored in a TEXT column.
+
+    The models work on the decoded Python structures; the value is decoded
+    once when the row is loaded and encoded once when it is flushed. The
+    stored format is the same json.dumps text as before, so existing rows
+    load unchanged.
+    """
+
+    impl = db.Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return json.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return json.loads(value)
+
+
+def _track(value, root):
+    """Wrap nested dicts and lists so that changing them flags the root"""
+    if isinstance(value, (TrackedDict, TrackedList)) and value._root is root:
+        return value
+    if isinstance(value, dict):
+        return TrackedDict(value, root)
+    if isinstance(value, list):
+        return TrackedList(value, root)
+    return value
+
+
+def to_plain(value):
+    """Deep copy a JSON value into plain dicts and lists, detached from any row"""
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
+
+
+class _Tracked(Mutable):
+    """Change tracking shared by TrackedDict and TrackedList.
+
+    Only the top-level value is associated with the mapped attribute. Nested
+    containers keep a reference to it and report their changes through it, so
+    e.g. board.rooms["hall"].append(player_id) is flushed like an assignment.
+    """
+
+    def changed(self):
+        if self._root is self:
+            Mutable.changed(self)
+        else:
+            self._root.changed()
+
+    def __reduce_ex__(self, protocol):
+        return to_plain, (to_plain(self),)
+
+
+class TrackedDict(_Tracked, dict):
+
+    def __init__(self, data=(), root=None):
+        self._root = self if root is None else root
+        dict.__init__(self, {key: _track(item, self._root) for key, item in dict(data).items()})
+
+    @classmethod
+    def coerce(cls, key, value):
+        if isinstance(value, cls) and value._root is value:
+            return value
+        if isinstance(value, dict):
+            return cls(value)
+        return Mutable.coerce(key, value)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, _track(value, self._root))
+        self.changed()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.changed()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            dict.__setitem__(self, key, _track(value, self._root))
+        self.changed()
+
+    def pop(self, *args):
+        result = dict.pop(self, *args)
+        self.changed()
+        return result
+
+    def popitem(self):
+        result = dict.popitem(self)
+        self.changed()
+        return result
+
+    def clear(self):
+        dict.clear(self)
+        self.changed()
+
+
+class TrackedList(_Tracked, list):
+
+    def __init__(self, data=(), root=None):
+        self._root = self if root is None else root
+        list.__init__(self, [_track(item, self._root) for item in data])
+
+    @classmethod
+    def coerce(cls, key, value):
+        if isinstance(value, cls) and value._root is value:
+            return value
+        if isinstance(value, list):
+            return cls(value)
+        return Mutable.coerce(key, value)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [_track(item, self._root) for item in value]
+        else:
+            value = _track(value, self._root)
+        list.__setitem__(self, index, value)
+        self.changed()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self.changed()
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def append(self, value):
+        list.append(self, _track(value, self._root))
+        self.changed()
+
+    def extend(self, values):
+        list.extend(self, [_track(item, self._root) for item in values])
+        self.changed()
+
+    def insert(self, index, value):
+        list.insert(self, index, _track(value, self._root))
+        self.changed()
+
+    def pop(self, *args):
+        result = list.pop(self, *args)
+        self.changed()
+        return result
+
+    def remove(self, value):
+        list.remove(self, value)
+        self.changed()
+
+    def clear(self):
+        list.clear(self)
+        self.changed()
+
+    def sort(self, **kwargs):
+        list.sort(self, **kwargs)
+        self.changed()
+
+    def reverse(self):
+        list.reverse(self)
+        self.changed()
+
+
+# Column types for JSON objects and JSON arrays
+JSONDict = TrackedDict.as_mutable(JSONEncoded)
+JSONList = TrackedList.as_mutable(JSONEncoded)
@@ -0,0 +1,180 @@
+"""Check that the queries of the game server use indexes.
+
+Plays a few games through the Socket.IO handlers, as loadtest.py does, then
+sends the lobby and catch-up events the games do not (quick_join, add_bot,
+GET /lobby/list, get_board_state, get_suggestion_history), runs the startup
+queries (load_lobby_index, rebuilding a game after a restart) and the
+archiver. Every SQL statement issued is recorded and SQLite is asked for the
+plan of each one with EXPLAIN QUERY PLAN. A statement that scans a
+whole table is reported and the script exits with status 1, so it can run
+in CI next to the load test:
+
+    python queryplan.py
+    python queryplan.py --verbose    # print every plan
+
+Scans of tiny tables that are expected (ALLOWED_SCANS) are not reported.
+"""
+import argparse
+import contextlib
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+# Tables a full scan is fine on: lobby_id_block has a single row
+ALLOWED_SCANS = {"lobby_id_block"}
+
+SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(.*)$")
+
+
+def full_scans(plan):
+    """The tables a query plan reads in full"""
+    tables = []
+    for row in plan:
+        match = SCAN.match(row[-1])
+        # "SCAN t USING COVERING INDEX" still reads every entry of the index
+        if match and match.group(1) not in ALLOWED_SCANS:
+            tables.append(match.group(1))
+    return tables
+
+
+class StatementRecorder:
+    """The distinct statements run on an engine, with parameters to explain them"""
+
+    def __init__(self):
+        self.statements = {}
+        self._lock = threading.Lock()
+
+    def watch(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if executemany:
+                parameters = parameters[0] if parameters else ()
+            with self._lock:
+                self.statements.setdefault(statement, parameters)
+
+
+def explain(engine, statements):
+    """EXPLAIN QUERY PLAN of each statement, skipping those SQLite cannot explain"""
+    plans = {}
+    with engine.connect() as connection:
+        raw = connection.connection.driver_connection
+        for statement, parameters in statements.items():
+            if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+                continue
+            plans[statement] = raw.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return plans
+
+
+def wait_for(client, event_name, timeout=5.0):
+    """The first event_name a test client receives, waiting for background tasks"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for message in client.get_received():
+            if message["name"] == event_name:
+                return message["args"][0]
+        time.sleep(0.01)
+    return None
+
+
+def play_other_events(app, socketio, finished_lobby_id):
+    """The events and queries SimulatedGame does not cover"""
+    from models import game_states
+    from models.game_state import GameStateStore
+    from routes.lobby import load_lobby_index
+
+    http = app.test_client()
+
+    # A waiting lobby, given a bot by its host and a player by quick join
+    response = http.post("/lobby/host", json={"name": "host"}).get_json()
+    lobby_id, host_id = response["lobby_id"], response["player_id"]
+    host = socketio.test_client(app)
+    host.emit("join_lobby", {"lobby_id": lobby_id, "player_id": host_id})
+    host.get_received()
+    host.emit("add_bot", {"lobby_id": lobby_id, "player_id": host_id})
+    # The bot joins from the bots' background task
+    wait_for(host, "lobby_joined")
+    socketio.test_client(app).emit("quick_join", {"name": "quick"})
+    http.get("/lobby/list")
+    with app.app_context():
+        load_lobby_index()
+
+    # A game in progress, caught up with by a client
+    client = socketio.test_client(app)
+    client.emit("join_lobby", {"lobby_id": lobby_id, "name": "late"})
+    host.emit("start_game", {"lobby_id": lobby_id, "player_id": host_id})
+    host.emit("get_board_state", {"lobby_id": lobby_id})
+    host.emit("get_suggestion_history", {"lobby_id": lobby_id})
+    # A finished game is read back from the database
+    host.emit("get_suggestion_history", {"lobby_id": finished_lobby_id})
+
+    # The game rebuilt from its rows, as after a restart
+    game_states.flush()
+    with app.app_context():
+        GameStateStore().get(lobby_id)
+
+
+def run(args):
+    db_dir = tempfile.mkdtemp(prefix="clueless-queryplan-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(db_dir, "queryplan.db")
+    os.environ["ARCHIVE_DIR"] = os.path.join(db_dir, "archive")
+    os.environ["ARCHIVE_INTERVAL"] = "0"
+    # A new database, given its schema by the migrations
+    os.environ["MIGRATE_ON_START"] = "1"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from main import app
+        from extensions import db, socketio
+        from models import game_states
+        from archive import game_archiver
+        from loadtest import SimulatedGame, Stats
+
+    recorder = StatementRecorder()
+    with app.app_context():
+        recorder.watch(db.engine)
+
+    rng = random.Random(args.seed)
+    stats = Stats()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for players in range(3, 7):
+            game = SimulatedGame(app, socketio, players, args.turns, stats, rng)
+            for _ in game.run():
+                pass
+        play_other_events(app, socketio, game.lobby_id)
+        game_states.flush()
+        # Archive everything, finished or not
+        game_archiver.run(now=time.time() + game_archiver.idle_ttl + 1)
+
+    with app.app_context():
+        return explain(db.engine, recorder.statements)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the queries that scan whole tables")
+    parser.add_argument("--turns", type=int, default=20, help="turns played in each game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every statement")
+    args = parser.parse_args(argv)
+
+    plans = run(args)
+    failures = 0
+    for statement, plan in plans.items():
+        scans = full_scans(plan)
+        if scans:
+            failures += 1
+        if scans or args.verbose:
+            print(("FULL SCAN of " + ", ".join(scans)) if scans else "ok")
+            print("  " + " ".join(statement.split()))
+            for row in plan:
+                print("    " + row[-1])
+    print(f"{len(plans)} statements, {failures} with a full table scan")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
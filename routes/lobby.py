@@ -1,9 +1,18 @@
 from flask import Blueprint, request, jsonify
 from flask_socketio import emit, join_room
-from models import Lobby, Player
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from models import Lobby, Player, game_states, load_lobby_for_event
 
+from bots import bot_players
 from extensions import db, socketio
-import json
+from metrics import instrumented
+from cluster import lobby_router
+from commands import lobby_commands
+from matchmaking import lobby_index
+from logs import get_logger, redact
+
+logger = get_logger(__name__)
 
 lobby_bp = Blueprint('lobby', __name__)
 
@@ -21,6 +30,7 @@ def host_lobby():
     db.session.flush()
 
     lobby = Lobby(host_id=host_player.id)
+    lobby.auto_disprove = bool(data.get('auto_disprove', False))
     db.session.add(lobby)
     db.session.flush()
 
@@ -29,58 +39,92 @@ def host_lobby():
 
     db.session.commit()
 
+    # Lobbies hosted on another worker are indexed by their owner on the first join
+    if lobby_router.owns(lobby.id):
+        lobby_index.update(lobby.id, 1, MAX_PLAYERS, host_name=host_player.name, auto_disprove=lobby.auto_disprove)
+
     socketio.emit('lobby_created', {'lobby_id': lobby.id})
 
     return jsonify({'lobby_id': lobby.id, 'player_id': host_player.id})
 
 
-@socketio.on('join_lobby')
-def join_lobby(data):
-    lobby_id = data['lobby_id']
-    player_id = data.get('player_id', None)  # Optional player_id parameter for the host
-    player_name = data.get('name', 'Anonymous')
+@lobby_bp.route('/list', methods=['GET'])
+def list_lobbies():
+    """Lobbies waiting for players, fullest first"""
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    return jsonify({'lobbies': lobby_index.listing(limit), 'max_players': MAX_PLAYERS})
+
+
+def load_lobby_index():
+    """Fill the matchmaking index with the waiting lobbies this worker owns"""
+    host = aliased(Player)
+    rows = (
+        db.session.query(Lobby.id, func.count(Player.id), host.name, Lobby.auto_disprove)
+        .outerjoin(Player, Player.lobby_id == Lobby.id)
+        .outerjoin(host, host.id == Lobby.host)
+        .filter(Lobby.status == 'waiting')
+        .group_by(Lobby.id, host.name, Lobby.auto_disprove)
+        .order_by(Lobby.id)
+    )
+    lobby_index.load([row for row in rows if lobby_router.owns(row[0])], MAX_PLAYERS)
 
-    lobby = Lobby.query.get(lobby_id)
+
+def _lobby_full_error(players):
+    return {
+        'message': f'This lobby already has {players} out of {MAX_PLAYERS} players',
+        'code': 'LOBBY_FULL',
+        'current_players': players,
+        'max_players': MAX_PLAYERS
+    }
+
+
+def _join(lobby_id, player_id, player_name):
+    """Seat a player in a lobby and announce it to the room.
+
+    Returns the error to send back if the player cannot join, or None.
+    """
+    # Known full without asking the database
+    if lobby_index.is_full(lobby_id) and not player_id:
+        return _lobby_full_error(MAX_PLAYERS)
+
+    lobby = load_lobby_for_event(lobby_id)
 
     if lobby is None:
-        emit('error', {'message': 'Lobby not found', 'code': 'LOBBY_NOT_FOUND'})
-        return
+        return {'message': 'Lobby not found', 'code': 'LOBBY_NOT_FOUND'}
 
     # Check if the lobby is already full
     if len(lobby.players) >= MAX_PLAYERS:
         # Return a more detailed error message for full lobbies
-        emit('error', {
-            'message': f'This lobby already has {len(lobby.players)} out of {MAX_PLAYERS} players',
-            'code': 'LOBBY_FULL',
-            'current_players': len(lobby.players),
-            'max_players': MAX_PLAYERS
-        })
-        return
+        return _lobby_full_error(len(lobby.players))
 
     # Check if the game has already started
     if lobby.status == 'in_progress':
-        emit('error', {'message': 'Game already in progress', 'code': 'GAME_IN_PROGRESS'})
-        return
+        return {'message': 'Game already in progress', 'code': 'GAME_IN_PROGRESS'}
 
     # If player_id is provided, the host is joining their own lobby
     if player_id:
-        player = Player.query.get(player_id)
+        player = lobby.get_player(player_id)
         if not player:
-            emit('error', {'message': 'Player not found', 'code': 'PLAYER_NOT_FOUND'})
-            return
+            return {'message': 'Player not found', 'code': 'PLAYER_NOT_FOUND'}
     else:
         # Create a new player
         player = Player(name=player_name, lobby_id=lobby_id)
         db.session.add(player)
         lobby.players.append(player)
+        lobby.touch()
         db.session.commit()
 
+    if lobby.status == 'waiting':
+        host = lobby.get_player(lobby.host)
+        lobby_index.update(lobby_id, len(lobby.players), MAX_PLAYERS,
+                           host_name=host.name if host else None, auto_disprove=lobby.auto_disprove)
+
     # Join the lobby's Socket.IO room
     join_room(lobby_id)
 
     # Also join a private room for this player, enabling direct messaging
     join_room(player.id)
-    print(f"Player {player.name} joined their private room: {player.id}")
+    logger.info("Player joined lobby", extra={"lobby_id": lobby_id, "player_id": player.id})
 
     # Get the current player list
     players_list = [{'player_id': p.id, 'name': p.name, 'is_host': p.id == lobby.host} for p in lobby.players]
@@ -96,12 +140,85 @@ def join_lobby(data):
         'can_start': len(lobby.players) >= MIN_PLAYERS
     }, room=lobby_id)
 
+
+@socketio.on('join_lobby')
+@lobby_router.route
+@instrumented
+@lobby_commands.serialized
+def join_lobby(data):
+    lobby_id = data['lobby_id']
+    player_id = data.get('player_id', None)  # Optional player_id parameter for the host
+    player_name = data.get('name', 'Anonymous')
+
+    error = _join(lobby_id, player_id, player_name)
+    if error:
+        emit('error', error)
+
+
+@socketio.on('quick_join')
+@instrumented
+def quick_join(data):
+    """Join the fullest lobby that still has a seat, so games fill up and start"""
+    player_name = data.get('name', 'Anonymous')
+
+    tried = set()
+    while True:
+        lobby_id = lobby_index.claim(exclude=tried)
+        if lobby_id is None:
+            emit('error', {'message': 'No lobby is waiting for players', 'code': 'NO_OPEN_LOBBY'})
+            return
+        try:
+            error = lobby_commands.run(lobby_id, _join, lobby_id, None, player_name)
+        finally:
+            lobby_index.release(lobby_id)
+        if error is None:
+            return
+        # Filled up or started since it was indexed
+        logger.debug("Quick join skipped lobby", extra={"lobby_id": lobby_id, "code": error['code']})
+        if error['code'] != 'LOBBY_FULL':
+            lobby_index.remove(lobby_id)
+        tried.add(lobby_id)
+
+
+@socketio.on('add_bot')
+@lobby_router.route
+@instrumented
+@lobby_commands.serialized
+def add_bot(data):
+    lobby_id = data['lobby_id']
+    player_id = data['player_id']
+
+    lobby = load_lobby_for_event(lobby_id)
+
+    if lobby is None:
+        emit('error', {'message': 'Lobby not found', 'code': 'LOBBY_NOT_FOUND'})
+        return
+
+    if lobby.host != player_id:
+        emit('error', {'message': 'Only the host can add bots', 'code': 'NOT_HOST'})
+        return
+
+    if lobby.status != 'waiting' or len(lobby.players) >= MAX_PLAYERS:
+        emit('error', {'message': 'No seat left for a bot', 'code': 'LOBBY_FULL'})
+        return
+
+    if not bot_players.available:
+        emit('error', {'message': 'Bots are not available on this server', 'code': 'BOTS_UNAVAILABLE'})
+        return
+
+    # The bot joins through join_lobby, from the bots' background task
+    bot_players.add(lobby_id)
+
+
 @socketio.on('start_game')
+@lobby_router.route
+@instrumented
+@lobby_commands.serialized
 def start_game(data):
     lobby_id = data['lobby_id']
     player_id = data['player_id']
 
-    lobby = Lobby.query.get(lobby_id)
+    lobby = load_lobby_for_event(lobby_id)
 
     if lobby is None:
         emit('error', {'message': 'Lobby not found', 'code': 'LOBBY_NOT_FOUND'})
@@ -128,145 +245,114 @@ def start_game(data):
         })
         return
 
-    # Initialize the game board and cards
-    lobby.initialize_game()
+    # Initialize the game board and cards (committed as one transaction)
+    try:
+        lobby.initialize_game()
+    except ValueError as e:
+        emit('error', {'message': str(e), 'code': 'START_ERROR'})
+        return
 
-    db.session.commit()
+    # From here on the game is played on the in-memory state
+    state = game_states.register(lobby)
+    lobby_index.remove(lobby_id)
 
     # Get the player who has the first turn
-    current_player = lobby.players[lobby.current_turn_idx]
-
-    # Get the board to check if the player is in a room
-    board = lobby.get_board()
-    in_room = False
-    current_location = None
-
-    if board:
-        # Find player's location on the board
-        player_location = board._find_player_on_board(current_player.id)
-        if player_location and player_location["type"] == "room":
-            in_room = True
-            current_location = player_location["location"]
-
-    # Get all player positions to broadcast
-    all_player = lobby.getAllPlayers_state()
-
-    player_positions = []
-    for player in all_player:
-        # Get the player information from the board state
-        player_info = {
-            'player_id': player['id'],
-            'name': player['name'],
-            'character': player['character'].get('name', 'Unknown'),
-            'position': player['character'].get('position', 'Unknown'),
-            'position_type': player['character'].get('type', 'Unknown'),
-        }
-        player_positions.append(player_info)
+    current_player = state.current_player()
+
+    # Check if the player is in a room
+    current_location = state.current_room(current_player["id"])
 
     # Get valid moves for the current player
-    valid_moves = lobby.show_available_moves(current_player.id)
+    valid_moves = state.available_moves(current_player["id"])
 
-    print(f"Valid moves for {current_player.name}: {valid_moves}")
+    logger.info("Game started", extra={"lobby_id": lobby_id, "players": len(state.turn_order)})
 
     # Emit game started event with the initial turn information and board state
     emit('game_started', {
-        'current_player_id': current_player.id,
-        'current_player_name': current_player.name,
-        'player_positions': player_positions,
+        'current_player_id': current_player["id"],
+        'current_player_name': current_player["name"],
+        'player_positions': state.player_positions(),
+        'seq': state.seq,
         'valid_moves': valid_moves,
-        'in_room': in_room,
+        'in_room': current_location is not None,
         'current_location': current_location
     }, room=lobby_id)
 
 
 @socketio.on('next_turn')
+@lobby_router.route
+@instrumented
+@lobby_commands.serialized
 def next_turn(data):
     lobby_id = data['lobby_id']
+    player_id = data.get('player_id')
 
-    lobby = Lobby.query.get(lobby_id)
+    state = game_states.get(lobby_id)
 
-    if lobby is None:
+    if state is None:
         emit('error', {'message': 'Lobby not found', 'code': 'LOBBY_NOT_FOUND'})
         return
 
-    next_player = lobby.next_turn()
-
-    # Get the board to check if the player is in a room
-    board = lobby.get_board()
-    in_room = False
-    current_location = None
-
-    if board:
-        # Find player's location on the board
-        player_location = board._find_player_on_board(next_player.id)
-        if player_location and player_location["type"] == "room":
-            in_room = True
-            current_location = player_location["location"]
-
-    # Get all player positions to broadcast
-    player_positions = []
-    for player in lobby.players:
-        player_info = player._get_player_state()
-        character = player_info.get('character', {})
-        print(player_info)
-        player_positions.append({
-            'player_id': player.id,
-            'name': player.name,
-            'character': character.get('name', 'Unknown'),
-            'position': character.get('position', 'Unknown'),
-            'position_type': character.get('type', 'Unknown'),
-            'cards': character.get('cards', 'Unknown')
-        })
+    # Only the current player ends their turn
+    current_player = state.current_player()
+    if current_player is None or current_player["id"] != player_id:
+        emit('error', {'message': 'Not your turn', 'code': 'NOT_YOUR_TURN'})
+        return
 
-    # Get valid moves for the current player
-    valid_moves = lobby.show_available_moves(next_player.id)
+    next_player = state.next_turn()
+    game_states.mark_dirty(state)
 
-    db.session.commit()
+    # Check if the player is in a room
+    current_location = state.current_room(next_player["id"])
+
+    # Get valid moves for the current player
+    valid_moves = state.available_moves(next_player["id"])
 
     emit('turn_update', {
-        'player_id': next_player.id,
-        'player_name': next_player.name,
-        'player_positions': player_positions,
+        'player_id': next_player["id"],
+        'player_name': next_player["name"],
         'valid_moves': valid_moves,
-        'in_room': in_room,
-        'current_location': current_location
+        'in_room': current_location is not None,
+        'current_location': current_location,
+        **state.take_delta()
     }, room=lobby_id)
 
 
 @socketio.on('get_my_cards')
+@lobby_router.route
+@instrumented
+@lobby_commands.serialized
 def get_player_cards(data):
     lobby_id = data['lobby_id']
     player_id = data['player_id']
 
     # Log the request
-    print(f"Player {player_id} requesting their cards from lobby {lobby_id}")
-    print(f"Current socket session ID: {request.sid}")
+    logger.debug("Cards requested", extra={"lobby_id": lobby_id, "player_id": player_id, "sid": request.sid})
 
-    lobby = Lobby.query.get(lobby_id)
+    state = game_states.get(lobby_id)
 
-    if lobby is None:
+    if state is None:
         emit('error', {'message': 'Lobby not found', 'code': 'LOBBY_NOT_FOUND'})
         return
 
     # Get the player's cards
-    player = Player.query.filter_by(id=player_id, lobby_id=lobby_id).first()
+    player = state.get_player(player_id)
     if not player:
-        print(f"Player {player_id} not found in lobby {lobby_id}")
+        logger.warning("Player %s not found in lobby %s", player_id, lobby_id)
         emit('error', {'message': 'Player not found', 'code': 'PLAYER_NOT_FOUND'})
         return
 
     # Get the player's cards
     try:
-        player_cards = json.loads(player.cards)
-        print(f"Sending cards to player {player_id} ({player.name}): {player_cards}")
+        player_cards = state.player_cards(player_id)
 
         # Send cards ONLY to the requesting socket connection
         emit('my_cards', {
             'player_id': player_id,  # Include player ID for verification
             'cards': player_cards
         })
-        print(f"Cards sent to player {player.name} via socket {request.sid}")
+        logger.debug("Cards %s sent to player %s", redact(player_cards), player_id)
 
     except Exception as e:
-        print(f"Error sending cards to player {player_id}: {str(e)}")
+        logger.exception("Error sending cards to player %s", player_id)
         emit('error', {'message': f'Error getting cards: {str(e)}', 'code': 'CARD_ERROR'})
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Production launcher for the game server.
+
+Runs the app without Flask's debugger and reloader, on the selected
+Socket.IO async mode:
+
+    python serve.py --async-mode eventlet --port 5000
+    python serve.py --async-mode gevent --database-url postgresql://...
+
+To use several cores, start one worker per core behind a load balancer
+with sticky sessions, all with the same --workers and --message-queue and
+each with its own --worker-id (see cluster.py):
+
+    python serve.py --port 5001 --workers 4 --worker-id 0 --message-queue redis://localhost:6379/0
+
+eventlet and gevent serve each socket from a green thread, so one process
+holds thousands of connections (raise the open files limit to match, e.g.
+`ulimit -n 65536`). Their monkey patching has to happen before anything
+else is imported, which is why this is a separate entry point from main.py.
+threading works everywhere but needs one OS thread per socket.
+
+The database is whatever DATABASE_URL (or --database-url) points to, with
+its schema up to date: run `python -m migrations upgrade` first. The
+default SQLite file is fine for one box; since SQLite calls cannot yield
+to other green threads, a server database scales further under eventlet
+and gevent.
+"""
+import argparse
+import importlib.util
+import os
+
+ASYNC_MODES = ("auto", "eventlet", "gevent", "threading")
+
+
+def resolve_async_mode(async_mode):
+    """The async mode to run, "auto" being the first one installed"""
+    if async_mode != "auto":
+        return async_mode
+    for candidate in ("eventlet", "gevent"):
+        if importlib.util.find_spec(candidate) is not None:
+            return candidate
+    return "threading"
+
+
+def monkey_patch(async_mode):
+    if async_mode == "eventlet":
+        import eventlet
+        eventlet.monkey_patch()
+    elif async_mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the game server")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--async-mode", choices=ASYNC_MODES,
+                        default=os.environ.get("SOCKETIO_ASYNC_MODE", "auto"))
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes of the cluster")
+    parser.add_argument("--worker-id", type=int, default=None, help="index of this worker, from 0")
+    parser.add_argument("--message-queue", default=None, help="message queue URL shared by the workers")
+    parser.add_argument("--max-connections", type=int, default=10000,
+                        help="concurrent connections accepted by the eventlet server")
+    parser.add_argument("--access-log", action="store_true", help="log every HTTP request")
+    args = parser.parse_args(argv)
+
+    async_mode = resolve_async_mode(args.async_mode)
+    monkey_patch(async_mode)
+
+    # Read by main.py when it configures the app
+    os.environ["SOCKETIO_ASYNC_MODE"] = async_mode
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    if args.workers is not None:
+        os.environ["CLUSTER_WORKERS"] = str(args.workers)
+    if args.worker_id is not None:
+        os.environ["CLUSTER_WORKER_ID"] = str(args.worker_id)
+    if args.message_queue:
+        os.environ["SOCKETIO_MESSAGE_QUEUE"] = args.message_queue
+
+    from main import app, HOST, PORT
+    from extensions import socketio
+    from logs import get_logger
+
+    options = {}
+    if async_mode == "eventlet":
+        options["max_size"] = args.max_connections
+    elif async_mode == "threading":
+        # Werkzeug's server is the only one available in this mode
+        options["allow_unsafe_werkzeug"] = True
+
+    get_logger("serve").info("Serving", extra={"async_mode": socketio.async_mode})
+    socketio.run(
+        app,
+        host=args.host or HOST,
+        port=args.port or PORT,
+        debug=False,
+        use_reloader=False,
+        log_output=args.access_log,
+        **options,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Monte Carlo simulator for rule and balance analysis.
+
+Plays many games with the rules of engine.Game, without the server or the
+database, across a pool of worker processes, and reports how they went:
+turns to solve the case, the win rate of each seat in the turn order and of
+each character, and how many suggestions were made.
+
+    python simulate.py --games 1e6 --players 3-6 --workers 8 --out results.json
+
+Simulated players keep a notebook of the cards they have seen and accuse as
+soon as it leaves one candidate in each category. With --strategy notebook
+(the default) they suggest cards they have not seen yet; with --strategy
+random they suggest any card.
+
+--out writes one column per statistic, with one value per game, next to the
+summary, so the results can be loaded into a dataframe as is.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from engine import CARD_NAMES, CHARACTERS, Game
+from engine.cards import ALL_CARDS, ROOM_MASK, SUSPECT_MASK, WEAPON_MASK, SUSPECTS, WEAPONS
+
+STRATEGIES = ("notebook", "random")
+
+# Games played per task sent to a worker
+CHUNK_SIZE = 1000
+
+# Per-game columns of the output, see play_game
+COLUMNS = ("players", "solved", "turns", "suggestions", "winner_seat", "winner_character", "first_character")
+
+
+def parse_players(value):
+    """Parse a player count such as "4" or a range such as "3-6" or "3..6" """
+    low, _, high = value.replace("..", "-").partition("-")
+    low, high = int(low), int(high or low)
+    if not 3 <= low <= high <= len(CHARACTERS):
+        raise argparse.ArgumentTypeError(f"player counts must be between 3 and {len(CHARACTERS)}")
+    return low, high
+
+
+def parse_count(value):
+    """Parse a game count, allowing e.g. 1e6"""
+    return int(float(value))
+
+
+def lowest_card(mask):
+    return (mask & -mask).bit_length() - 1
+
+
+def pick_card(mask, rng):
+    """A random card of a mask"""
+    cards = [card for card in range(len(CARD_NAMES)) if mask >> card & 1]
+    return rng.choice(cards)
+
+
+def pinned(known):
+    """The solution, if a notebook leaves one candidate per category"""
+    unknown = ALL_CARDS & ~known
+    candidates = [unknown & SUSPECT_MASK, unknown & WEAPON_MASK, unknown & ROOM_MASK]
+    if all(mask and mask & (mask - 1) == 0 for mask in candidates):
+        return [CARD_NAMES[lowest_card(mask)] for mask in candidates]
+    return None
+
+
+def play_game(n_players, strategy, max_turns, rng):
+    """Play one game; returns its row of COLUMNS and the characters played"""
+    game = Game.new(
+        "SIM", "p0",
+        [{"id": f"p{n}", "name": f"p{n}"} for n in range(n_players)],
+        rng=rng,
+    )
+    notebooks = {player_id: player["hand"] for player_id, player in game.players.items()}
+    characters = [player["character"]["name"] for player in game.get_ordered_players()]
+
+    turns = 0
+    while turns < max_turns:
+        player = game.current_player()
+        player_id = player["id"]
+        turns += 1
+
+        if not player["eliminated"]:
+            solution = pinned(notebooks[player_id])
+            if solution:
+                if game.make_accusation(player_id, *solution)["is_correct"]:
+                    seat = game.current_turn_idx
+                    row = (n_players, 1, turns, len(game.suggestions), seat, characters[seat], characters[0])
+                    return row, characters
+                game.eliminate(player_id)
+                if not game.active_players():
+                    break
+            else:
+                take_turn(game, player_id, notebooks, strategy, rng)
+
+        game.next_turn()
+
+    return (n_players, 0, turns, len(game.suggestions), -1, "", characters[0]), characters
+
+
+def take_turn(game, player_id, notebooks, strategy, rng):
+    """Move, and make a suggestion if the move ends in a room"""
+    moves = game.available_moves(player_id) or []
+    rng.shuffle(moves)
+    for move in moves:
+        try:
+            game.move_player(player_id, move)
+            break
+        except ValueError:
+            # Hallway taken, try another way out
+            continue
+
+    if game.current_room(player_id) is None:
+        return
+
+    known = notebooks[player_id]
+    if strategy == "notebook":
+        unknown = ALL_CARDS & ~known
+        suspect = CARD_NAMES[pick_card(unknown & SUSPECT_MASK or SUSPECT_MASK, rng)]
+        weapon = CARD_NAMES[pick_card(unknown & WEAPON_MASK or WEAPON_MASK, rng)]
+    else:
+        suspect = rng.choice(SUSPECTS).label
+        weapon = rng.choice(WEAPONS).label
+
+    suggestion, _ = game.make_suggestion(player_id, suspect, weapon)
+    _, disprover_id, cards = game.resolve_disproval(suggestion)
+
+    if disprover_id is not None:
+        card = pick_card(cards, rng)
+        game.check_suggestion(len(game.suggestions) - 1, disprover_id, CARD_NAMES[card])
+        notebooks[player_id] = known | 1 << card
+        return
+
+    # Nobody else holds these cards: those not in our hand are the solution
+    for category_mask in (SUSPECT_MASK, WEAPON_MASK, ROOM_MASK):
+        card_bit = suggestion["mask"] & category_mask
+        if card_bit and not game.players[player_id]["hand"] & card_bit:
+            known |= category_mask & ~card_bit
+    notebooks[player_id] = known
+
+
+def run_chunk(task):
+    """Play a chunk of games in a worker process"""
+    chunk_idx, n_games, players, strategy, max_turns, seed = task
+    rng = random.Random(f"{seed}-{chunk_idx}")
+    low, high = players
+
+    columns = {name: [] for name in COLUMNS}
+    character_games = Counter()
+    for _ in range(n_games):
+        row, characters = play_game(rng.randint(low, high), strategy, max_turns, rng)
+        for name, value in zip(COLUMNS, row):
+            columns[name].append(value)
+        character_games.update(characters)
+    return columns, character_games
+
+
+def summarize(columns, character_games):
+    games = len(columns["players"])
+    rows = list(zip(*(columns[name] for name in COLUMNS)))
+    solved = [row for row in rows if row[1]]
+
+    seat_games = Counter()
+    for n_players in columns["players"]:
+        seat_games.update(range(n_players))
+    seat_wins = Counter(row[4] for row in solved)
+    character_wins = Counter(row[5] for row in solved)
+    first_games = Counter(columns["first_character"])
+    first_wins = Counter(row[6] for row in solved if row[4] == 0)
+
+    by_players = {}
+    for n_players in sorted(set(columns["players"])):
+        played = [row for row in rows if row[0] == n_players]
+        won = [row for row in played if row[1]]
+        by_players[n_players] = {
+            "games": len(played),
+            "solved_rate": len(won) / len(played),
+            "avg_turns_to_solve": sum(row[2] for row in won) / len(won) if won else None,
+            "first_player_win_rate": sum(1 for row in won if row[4] == 0) / len(played),
+        }
+
+    return {
+        "games": games,
+        "solved_rate": len(solved) / games,
+        "avg_turns_to_solve": sum(row[2] for row in solved) / len(solved) if solved else None,
+        "avg_suggestions": sum(columns["suggestions"]) / games,
+        "first_player_win_rate": seat_wins[0] / games,
+        # Over the games in which the seat (or the character) was played
+        "seat_win_rate": {seat: seat_wins[seat] / count for seat, count in sorted(seat_games.items())},
+        "character_win_rate": {
+            name: character_wins[name] / character_games[name] for name in CHARACTERS if character_games[name]
+        },
+        # Win rate of the first player by the character they play, that is
+        # by the start hallway they leave from
+        "first_player_win_rate_by_character": {
+            name: first_wins[name] / first_games[name] for name in CHARACTERS if first_games[name]
+        },
+        "by_players": by_players,
+    }
+
+
+def print_report(summary, elapsed, out=sys.stdout):
+    print(f"{summary['games']} games in {elapsed:.1f}s ({summary['games'] / elapsed:.0f} games/s)", file=out)
+    avg_turns = summary["avg_turns_to_solve"]
+    turns = f"{avg_turns:.1f}" if avg_turns is not None else "n/a"
+    print(f"solved: {summary['solved_rate']:.1%}, turns to solve: {turns}", file=out)
+    print(f"suggestions per game: {summary['avg_suggestions']:.1f}", file=out)
+    print(f"first player win rate: {summary['first_player_win_rate']:.1%}", file=out)
+
+    print(f"{'players':<10}{'games':>10}{'solved':>10}{'turns':>10}{'first wins':>12}", file=out)
+    for n_players, row in summary["by_players"].items():
+        turns = f"{row['avg_turns_to_solve']:.1f}" if row["avg_turns_to_solve"] is not None else "-"
+        print(f"{n_players:<10}{row['games']:>10}{row['solved_rate']:>10.1%}{turns:>10}"
+              f"{row['first_player_win_rate']:>12.1%}", file=out)
+
+    print(f"{'seat':<16}{'win rate':>10}", file=out)
+    for seat, rate in summary["seat_win_rate"].items():
+        print(f"{seat:<16}{rate:>10.1%}", file=out)
+
+    print(f"{'character':<16}{'win rate':>10}{'as first':>10}", file=out)
+    for name, rate in summary["character_win_rate"].items():
+        first = summary["first_player_win_rate_by_character"].get(name)
+        first = f"{first:.1%}" if first is not None else "-"
+        print(f"{name:<16}{rate:>10.1%}{first:>10}", file=out)
+
+
+def run(args):
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    tasks = []
+    for chunk_idx, start in enumerate(range(0, args.games, CHUNK_SIZE)):
+        n_games = min(CHUNK_SIZE, args.games - start)
+        tasks.append((chunk_idx, n_games, args.players, args.strategy, args.max_turns, seed))
+
+    columns = {name: [] for name in COLUMNS}
+    character_games = Counter()
+
+    def collect(results):
+        for chunk_columns, chunk_characters in results:
+            for name in COLUMNS:
+                columns[name].extend(chunk_columns[name])
+            character_games.update(chunk_characters)
+
+    # Chunks are collected in order, so a seed always gives the same output
+    if args.workers > 1:
+        with multiprocessing.Pool(args.workers) as pool:
+            collect(pool.imap(run_chunk, tasks))
+    else:
+        collect(map(run_chunk, tasks))
+
+    return seed, columns, character_games
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate games for rule and balance analysis")
+    parser.add_argument("--games", type=parse_count, default=10000, help="number of games, e.g. 1e6")
+    parser.add_argument("--players", type=parse_players, default=(3, 6),
+                        help="players per game, a number or a range such as 3-6")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="notebook")
+    parser.add_argument("--max-turns", type=int, default=500, help="turns after which a game is abandoned")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", default=None,
+                        help="write the summary and the per-game columns to this JSON file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    seed, columns, character_games = run(args)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(columns, character_games)
+    print_report(summary, elapsed)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "seed": seed,
+                "strategy": args.strategy,
+                "summary": summary,
+                "columns": columns,
+            }, f)
+
+
+if __name__ == "__main__":
+    main()
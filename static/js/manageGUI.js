@@ -18,7 +18,10 @@ document.getElementById('hostLobbyBtn').addEventListener('click', function() {
     fetch('/lobby/host', {
     method: 'POST',
     headers: {'Content-Type': 'application/json'},
-    body: JSON.stringify({name: hostName})
+    body: JSON.stringify({
+        name: hostName,
+        auto_disprove: document.getElementById('autoDisprove').checked
+    })
     })
     .then(response => response.json())
     .then(data => {
@@ -86,6 +89,31 @@ document.getElementById('joinLobbyBtn').addEventListener('click', function() {
 });
 
 
+// When the Quick Join button is clicked
+document.getElementById('quickJoinBtn').addEventListener('click', function() {
+    const joinName = document.getElementById('joinName').value;
+
+    if (!joinName.trim()) {
+    document.getElementById('joinResult').innerHTML =
+        '<p class="error">Please enter your name</p>';
+    return;
+    }
+
+    // The lobby ID is set from the lobby_joined response
+    isHost = false;
+
+    document.getElementById('lobbyNotification').style.display = 'none';
+    document.getElementById('joinResult').innerHTML = '<p>Looking for a lobby...</p>';
+
+    // Emit the quick_join event, the server picks the lobby
+    socket.emit('quick_join', {name: joinName});
+
+    // Hide host/join sections, shown again if no lobby is open
+    document.getElementById('hostSection').style.display = 'none';
+    document.getElementById('joinSection').style.display = 'none';
+});
+
+
 // When the Start Game button is clicked
 document.getElementById('startGameBtn').addEventListener('click', function() {
     if (!isHost) {
@@ -102,10 +130,19 @@ document.getElementById('startGameBtn').addEventListener('click', function() {
 });
 
 
+// When the Add Bot button is clicked
+document.getElementById('addBotBtn').addEventListener('click', function() {
+    socket.emit('add_bot', {
+    lobby_id: currentLobbyId,
+    player_id: currentPlayerId
+    });
+});
+
+
 // When the Next Turn button is clicked (for testing)
 document.getElementById('nextTurnBtn').addEventListener('click', function() {
     // Emit the next_turn event for the current lobby
-    socket.emit('next_turn', {lobby_id: currentLobbyId});
+    socket.emit('next_turn', {lobby_id: currentLobbyId, player_id: currentPlayerId});
 });
 
 
@@ -121,7 +158,7 @@ document.getElementById('skipSuggestionBtn').addEventListener('click', function(
     document.getElementById('suggestionForm').style.display = 'none';
 
     // Emit next turn event
-    socket.emit('next_turn', {lobby_id: currentLobbyId});
+    socket.emit('next_turn', {lobby_id: currentLobbyId, player_id: currentPlayerId});
 });
 
 
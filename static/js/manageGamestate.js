@@ -19,6 +19,7 @@ socket.on('game_started', function(data) {
     updateTurnInfo(data.current_player_id, data.current_player_name);
 
     // Update player positions on the board
+    boardSeq = data.seq || 0;
     updatePlayerPositions(data.player_positions);
 
     // Show suggestion history container
@@ -139,10 +140,8 @@ socket.on('turn_update', function(data) {
     // Update turn information
     updateTurnInfo(data.player_id, data.player_name);
 
-    // Update player positions on the board
-    if (data.player_positions) {
-        updatePlayerPositions(data.player_positions);
-    }
+    // Apply the position changes to the board
+    applyBoardDelta(data);
 
     // Check if it's our turn and show move options
     isMyTurn = (data.player_id === currentPlayerId);
@@ -315,9 +314,7 @@ socket.on('suggestion_made', function(data) {
     addSuggestionToHistory(data);
 
     // Update player positions for the moved character
-    if (data.player_positions) {
-        updatePlayerPositions(data.player_positions);
-    }
+    applyBoardDelta(data);
 
     // Clear any previous disprove notifications
     document.getElementById('turnResult').innerHTML = '';
@@ -371,6 +368,9 @@ socket.on('suggestion_made', function(data) {
         // If it's not our turn to disprove, hide the disprove form
         document.getElementById('disproveForm').style.display = 'none';
 
+        // Nobody left to ask (the server resolved the suggestion itself)
+        if (!data.next_to_disprove) return;
+
         // Add a message about who needs to disprove
         const disproverName = data.next_to_disprove_name || getPlayerNameById(data.next_to_disprove);
         const waitingMessage = document.createElement('div');
@@ -560,12 +560,123 @@ function updateTurnInfo(playerId, playerName) {
 }
 
 
+// Listen for 'board_state' event - the full board, sent after we missed an update
+socket.on('board_state', function(data) {
+    console.log('Board state:', data);
+
+    boardSeq = data.seq;
+    updatePlayerPositions(data.player_positions);
+    updateTurnInfo(data.current_player_id, data.current_player_name);
+
+    // We may have missed suggestions too
+    socket.emit('get_suggestion_history', {
+        lobby_id: currentLobbyId,
+        offset: 0
+    });
+});
+
+
+// Listen for 'suggestion_history' event - one page of the suggestion history
+socket.on('suggestion_history', function(data) {
+    data.suggestions.forEach(suggestion => {
+        if (document.querySelector(`[data-suggestion-idx="${suggestion.suggestion_idx}"]`)) return;
+        addSuggestionToHistory(suggestion);
+        if (suggestion.disproved_by) {
+            updateSuggestionInHistory(suggestion.suggestion_idx, suggestion.disproved_by);
+        }
+    });
+
+    // Ask for the next page until we have the whole history
+    const next = data.offset + data.suggestions.length;
+    if (data.suggestions.length && next < data.total) {
+        socket.emit('get_suggestion_history', {
+            lobby_id: currentLobbyId,
+            offset: next
+        });
+    }
+});
+
+
+// Function to apply the position changes of a board update
+function applyBoardDelta(data) {
+    // Events that don't change the board carry no sequence number
+    if (data.seq === undefined) return;
+
+    // If we missed an update, ask the server for the full board instead
+    if (data.seq !== boardSeq + 1) {
+        console.log(`Missed board update (have ${boardSeq}, got ${data.seq}), requesting full state`);
+        socket.emit('get_board_state', {
+            lobby_id: currentLobbyId
+        });
+        return;
+    }
+
+    boardSeq = data.seq;
+    (data.position_changes || []).forEach(updatePlayerPosition);
+}
+
+
+// Function to move a single player on the board and in the positions table
+function updatePlayerPosition(player) {
+    const idx = playerPositions.findIndex(p => p.player_id === player.player_id);
+    if (idx === -1) {
+        // Unknown player, redraw everything
+        updatePlayerPositions(playerPositions.concat([player]));
+        return;
+    }
+    playerPositions[idx] = player;
+
+    // Update the player's row in the table
+    const row = document.querySelector(`#playerPositionsBody tr[data-player-id="${player.player_id}"]`);
+    if (row && row.cells[2]) {
+        row.cells[2].textContent = formatPositionName(player.position);
+    }
+
+    // Move the player's token
+    const oldToken = document.querySelector(`.player-token[data-player-id="${player.player_id}"]`);
+    if (oldToken) {
+        oldToken.remove();
+    }
+
+    const positionElement = document.getElementById(player.position);
+    if (!positionElement) return;
+
+    const tokenIdx = positionElement.querySelectorAll('.player-token').length;
+    positionElement.appendChild(createPlayerToken(player, tokenIdx));
+}
+
+
+// Function to create the board token of a player
+function createPlayerToken(player, idx) {
+    const playerToken = document.createElement('div');
+    playerToken.classList.add('player-token');
+    playerToken.setAttribute('data-player-id', player.player_id);
+
+    // Get character class (e.g., "scarlet" from "Miss Scarlet")
+    if (player.character) {
+        const characterName = player.character.toLowerCase().split(' ')[1];
+        playerToken.classList.add('character-' + characterName);
+    }
+
+    // Add positioning class based on index
+    playerToken.classList.add('player-position-' + (idx % 6));
+
+    // Add title attribute for tooltip on hover
+    playerToken.title = `${player.name} (${player.character})${player.player_id === currentPlayerId ? ' (You)' : ''}`;
+
+    return playerToken;
+}
+
+
 // Function to update player positions on the board
 function updatePlayerPositions(positions) {
     if (!positions) return;
 
     console.log('Updating player positions:', positions);
 
+    // Keep the full list so later updates can be applied on top of it
+    playerPositions = positions.slice();
+
     // First clear existing player markers from all board spaces
     clearPlayerMarkers();
 
@@ -612,24 +723,8 @@ function updatePlayerPositions(positions) {
 
         const players = positionGroups[position];
         players.forEach(function(player, idx) {
-            // Create a player token
-            const playerToken = document.createElement('div');
-            playerToken.classList.add('player-token');
-
-            // Get character class (e.g., "scarlet" from "Miss Scarlet")
-            if (player.character) {
-                const characterName = player.character.toLowerCase().split(' ')[1];
-                playerToken.classList.add('character-' + characterName);
-            }
-
-            // Add positioning class based on index
-            playerToken.classList.add('player-position-' + (idx % 6));
-
-            // Add title attribute for tooltip on hover
-            playerToken.title = `${player.name} (${player.character})${player.player_id === currentPlayerId ? ' (You)' : ''}`;
-
-            // Add to the board
-            positionElement.appendChild(playerToken);
+            // Add a player token to the board
+            positionElement.appendChild(createPlayerToken(player, idx));
         });
     });
 }
@@ -16,6 +16,8 @@ let validMoves = [];
 let myCards = [];
 let suggestions = [];
 let currentSuggestion = null;
+let boardSeq = 0;
+let playerPositions = [];
 
 // Initialize flag to prevent endless loops
 window.isUpdatingDisproveForm = false;
@@ -112,6 +114,9 @@ socket.on('lobby_joined', function(data) {
         startGameBtn.textContent = data.players.length < minPlayers
             ? `Start Game (Need at least ${minPlayers} players)`
             : 'Start Game';
+        // The host can fill the empty seats with bots
+        document.getElementById('addBotBtn').style.display =
+            data.players.length < data.max_players ? 'inline-block' : 'none';
     } else {
         isHost = false;
         startGameBtn.disabled = true;
@@ -124,7 +129,7 @@ socket.on('error', function(data) {
     console.error('Error:', data);
 
     // Display error in appropriate section
-    if (data.code === 'LOBBY_FULL' || data.code === 'LOBBY_NOT_FOUND' || data.code === 'GAME_IN_PROGRESS') {
+    if (data.code === 'LOBBY_FULL' || data.code === 'LOBBY_NOT_FOUND' || data.code === 'GAME_IN_PROGRESS' || data.code === 'NO_OPEN_LOBBY') {
         // Show the join/host sections again for full lobby or not found scenarios
         document.getElementById('hostSection').style.display = 'block';
         document.getElementById('joinSection').style.display = 'block';
@@ -151,7 +156,7 @@ socket.on('error', function(data) {
         if (data.code === 'LOBBY_FULL') {
             document.getElementById('joinLobbyId').value = '';
         }
-    } else if (data.code === 'NOT_HOST' || data.code === 'NOT_ENOUGH_PLAYERS') {
+    } else if (data.code === 'NOT_HOST' || data.code === 'NOT_ENOUGH_PLAYERS' || data.code === 'BOTS_UNAVAILABLE') {
         document.getElementById('startGameResult').innerHTML = `<p class="error">${data.message}</p>`;
     } else if (data.code === 'NOT_YOUR_TURN') {
         document.getElementById('moveResult').innerHTML = `<p class="error">${data.message}</p>`;
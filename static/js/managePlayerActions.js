@@ -9,8 +9,8 @@
 socket.on('move_update', function(data) {
     console.log('Move update:', data);
 
-    // Update player positions on the board
-    updatePlayerPositions(data.player_positions);
+    // Apply the position changes to the board
+    applyBoardDelta(data);
 
     // Add move notification to turn result
     document.getElementById('turnResult').innerHTML =